@@ -0,0 +1,38 @@
+import random
+import time
+
+from ..entity_processing.batching import (
+    encode_sentence,
+    forward_all,
+    max_sequence_length,
+)
+from ..entity_processing.onnx_backend import OnnxBackend, compare_backends
+from ..entity_processing.recognition import get_articles, load_pipeline
+from .recognition_modes import get_sentences
+
+
+if __name__ == "__main__":
+    articles = get_articles("data/input/articles_tt_new.jsonl")
+    random.seed(1234567890)
+    articles = random.sample(articles, min(200, len(articles)))
+
+    nlp = load_pipeline()
+    max_length = max_sequence_length(nlp)
+    sentences = [s for sentences in get_sentences(articles) for s in sentences]
+    sequences = [encode_sentence(nlp.tokenizer, s) for s in sentences]
+    sequences = [ids for ids in sequences if len(ids) <= max_length]
+
+    backends = {
+        "pytorch": None,
+        "onnx": OnnxBackend(nlp),
+        "onnx-int8": OnnxBackend(nlp, quantize=True),
+    }
+
+    for name, backend in backends.items():
+        start = time.perf_counter()
+        forward_all(nlp, sequences, 32, backend=backend)
+        elapsed = time.perf_counter() - start
+        print(f"{name}: {len(sequences) / elapsed:.1f} sentences/s")
+
+        if backend:
+            compare_backends(nlp, backend, sequences)
@@ -0,0 +1,69 @@
+import argparse
+import random
+from collections import Counter
+
+from ..entity_processing.deduplication import find_duplicates
+
+# fmt: off
+SYLLABLES = [
+    "an", "ber", "ka", "lin", "sund", "ström", "vik", "berg", "holm", "ö", "dal",
+    "by", "sjö", "ås", "na", "ri", "to", "mar", "el", "gus", "jo", "fors", "tor",
+    "kul", "ly", "se", "vi", "da", "ham", "ne", "pe", "ro", "sa", "ul", "ing",
+]
+# fmt: on
+SUFFIXES = ["", "s", "en", " AB", " Cars"]
+
+
+def generate_vocabulary(no_words, variant_rate=0.2, seed=1234567890):
+    """Generates capitalised name-like strings, a share of them being misspelled or
+    abbreviated variants of earlier ones.
+    """
+    rng = random.Random(seed)
+    words = []
+
+    while len(words) < no_words:
+        if words and rng.random() < variant_rate:
+            word = list(rng.choice(words))
+            i = rng.randrange(len(word))
+            if rng.random() < 0.5:
+                word[i] = rng.choice("aeiouåäö")
+            else:
+                del word[i]
+            word = "".join(word)
+        else:
+            no_syllables = rng.randint(2, 4)
+            word = "".join(rng.choice(SYLLABLES) for _ in range(no_syllables))
+            word = word.capitalize() + rng.choice(SUFFIXES)
+            if rng.random() < 0.05:
+                word = "Sankt " + word if rng.random() < 0.5 else "S:t " + word
+
+        if word:
+            words += [word]
+
+    return sorted(set(words))
+
+
+def first_letter_pairs(words):
+    """The number of pairs compared by the first-letter scan of merge_entities."""
+    counts = Counter(word.lower()[0] for word in words)
+
+    return sum(n * (n - 1) // 2 for n in counts.values())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Entity deduplication scaling")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--threshold", type=float, default=0.8)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        words = generate_vocabulary(size)
+        _, stats = find_duplicates(words, args.threshold)
+
+        print(
+            f"{stats['words']} words: {stats['seconds']:.1f} s | "
+            f"candidate pairs = {stats['candidate_pairs']} "
+            f"(first-letter scan: {first_letter_pairs(words)}) | "
+            f"similar pairs = {stats['similar_pairs']} | "
+            f"clusters = {stats['clusters']}"
+        )
@@ -0,0 +1,96 @@
+import argparse
+import time
+
+import lemmy
+
+from ..entity_processing.cleaning import create_data_frames
+from ..entity_processing.lemma_store import LemmaStore
+from ..entity_processing.merging import merge_entities
+
+
+def merge_entities_per_scan(df):
+    """The previous approach, comparing every word with the later words sharing
+    its first letter and lemmatizing them anew every time, kept as a reference.
+    """
+    lemmatizer = lemmy.load("sv")
+    lemmatize = lambda x: lemmatizer.lemmatize("PROPN", x)[0].lower()
+    remove = []
+
+    for i in df.index:
+        i_w = df["word"][i]
+        if len(i_w) < 3:
+            continue
+        i_l = lemmatize(i_w)
+
+        for j in df.index[i + 1 :]:
+            j_w = df["word"][j]
+
+            # Continue outer loop if the first letter has changed
+            if not i_w.lower()[0] == j_w.lower()[0]:
+                break
+            j_l = lemmatize(j_w)
+
+            if i_l == j_l or i_w == j_l[0]:
+                df.at[i, "article_ids"] += df.at[j, "article_ids"]
+                remove += [j_w]
+
+    deduplicated = df[df["word"].apply(lambda x: x not in remove)]
+
+    return deduplicated
+
+
+def unique_entities(path):
+    desired = create_data_frames(path)[2]
+
+    return (
+        desired.groupby("word")["article_id"]
+        .apply(list)
+        .reset_index(name="article_ids")
+    )
+
+
+def copy_entities(df):
+    """Copies a DataFrame including its article_ids lists, which the reference
+    approach extends in place.
+    """
+    copied = df.copy()
+    copied["article_ids"] = [list(ids) for ids in df["article_ids"]]
+
+    return copied
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Entity merging throughput")
+    parser.add_argument("--input", default="data/output/results_10k.jsonl")
+    # The reference approach takes hours on the full vocabulary of 10k articles
+    parser.add_argument("--limit", type=int, default=5000)
+    args = parser.parse_args()
+
+    entities = unique_entities(args.input)
+    sample = entities.head(args.limit)
+    print(f"{len(entities)} unique words, comparing on the first {len(sample)}")
+
+    results = {}
+    # An empty lemma store, so that every word is lemmatized like before
+    with LemmaStore(":memory:") as empty_store:
+        runs = [(merge_entities_per_scan, []), (merge_entities, [empty_store])]
+        for merge, merge_args in runs:
+            start = time.perf_counter()
+            results[merge.__name__] = merge(copy_entities(sample), *merge_args)
+            elapsed = time.perf_counter() - start
+            print(f"{merge.__name__}: {len(sample) / elapsed:.1f} words/s")
+
+    reference, candidate = results.values()
+    same_words = reference["word"].tolist() == candidate["word"].tolist()
+    same_ids = reference["article_ids"].tolist() == candidate["article_ids"].tolist()
+    print(f"Same merged words: {same_words} | same article ids: {same_ids}")
+
+    with LemmaStore(":memory:") as lemma_store:
+        for state in ["cold", "warm"]:
+            start = time.perf_counter()
+            merged = merge_entities(entities, lemma_store)
+            elapsed = time.perf_counter() - start
+            print(
+                f"merge_entities on all words ({state} lemma store): "
+                f"{elapsed:.1f} s, {len(merged)} words kept"
+            )
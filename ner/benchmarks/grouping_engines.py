@@ -0,0 +1,122 @@
+import random
+import time
+from collections import Counter
+
+from transformers import BertTokenizerFast
+
+from ..entity_processing.batching import (
+    decode_entities,
+    forward_all,
+    max_sequence_length,
+)
+from ..entity_processing.offset_grouping import OffsetGrouper
+from ..entity_processing.recognition import (
+    MODEL_NAME,
+    PUNCTUATION,
+    extract_sentences,
+    get_articles,
+    group_entities,
+    load_pipeline,
+)
+from ..utils.file_handling import write_output_to_file
+
+
+def tag_articles(articles, nlp, grouper, punct, batch_size=32):
+    """Runs the model over every sentence once, keeping the sentences, token ids,
+    offsets and logits per article so that both engines group the same predictions.
+    """
+    max_length = max_sequence_length(nlp)
+    encoded = []
+
+    for article in articles:
+        sentences = extract_sentences(article, punct)[0]
+        encodings = [(s, *grouper.encode(s)) for s in sentences]
+        encoded += [[e for e in encodings if len(e[1]) <= max_length]]
+
+    sequences = [ids for encodings in encoded for _, ids, _ in encodings]
+    all_logits = iter(forward_all(nlp, sequences, batch_size))
+
+    return [
+        [(s, ids, offsets, next(all_logits)) for s, ids, offsets in encodings]
+        for encodings in encoded
+    ]
+
+
+def group_by_tokens(tagged, nlp, punct):
+    grouped = []
+    for sentences in tagged:
+        entities = []
+        for _, ids, _, logits in sentences:
+            entities += decode_entities(nlp, ids, logits)
+        grouped += [group_entities(entities, punct)]
+
+    return grouped
+
+
+def group_by_offsets(tagged, grouper):
+    grouped = []
+    for sentences in tagged:
+        entities = []
+        for sentence, ids, offsets, logits in sentences:
+            entities += grouper.group(sentence, ids, offsets, logits)
+        grouped += [entities]
+
+    return grouped
+
+
+def diff_outputs(articles, by_tokens, by_offsets):
+    """Lists the (word, type) entities found by only one of the engines per article."""
+    diffs = []
+
+    for article, token_ents, offset_ents in zip(articles, by_tokens, by_offsets):
+        token_cnt = Counter((e["word"], e["entity"]) for e in token_ents)
+        offset_cnt = Counter((e["word"], e["entity"]) for e in offset_ents)
+        only_tokens = sorted((token_cnt - offset_cnt).elements())
+        only_offsets = sorted((offset_cnt - token_cnt).elements())
+
+        if only_tokens or only_offsets:
+            diffs += [
+                {
+                    "id": article["id"],
+                    "only_tokens": only_tokens,
+                    "only_offsets": only_offsets,
+                }
+            ]
+
+    return diffs
+
+
+if __name__ == "__main__":
+    articles = get_articles("data/input/articles_tt_new.jsonl")
+    random.seed(1234567890)
+    articles = random.sample(articles, min(500, len(articles)))
+
+    nlp = load_pipeline()
+    fast_tokenizer = BertTokenizerFast.from_pretrained(MODEL_NAME)
+    grouper = OffsetGrouper(nlp, fast_tokenizer, PUNCTUATION)
+
+    tagged = tag_articles(articles, nlp, grouper, PUNCTUATION)
+    no_sentences = sum(len(sentences) for sentences in tagged)
+
+    start = time.perf_counter()
+    by_tokens = group_by_tokens(tagged, nlp, PUNCTUATION)
+    token_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    by_offsets = group_by_offsets(tagged, grouper)
+    offset_time = time.perf_counter() - start
+
+    print(f"group_entities: {no_sentences / token_time:.1f} sentences/s")
+    print(f"OffsetGrouper: {no_sentences / offset_time:.1f} sentences/s")
+
+    diffs = diff_outputs(articles, by_tokens, by_offsets)
+    no_entities = sum(len(entities) for entities in by_tokens)
+    no_only_tokens = sum(len(diff["only_tokens"]) for diff in diffs)
+    no_only_offsets = sum(len(diff["only_offsets"]) for diff in diffs)
+
+    print(f"{len(diffs)} of {len(articles)} articles differ")
+    print(
+        f"{no_only_tokens} of {no_entities} entities only found by group_entities, "
+        f"{no_only_offsets} only by OffsetGrouper"
+    )
+    write_output_to_file(diffs, "data/output/grouping_diff.jsonl")
@@ -0,0 +1,59 @@
+import argparse
+import os
+import tempfile
+import time
+
+import jsonlines
+
+from ..utils.jsonl import read_jsonl, write_jsonl
+
+
+def write_with_jsonlines(objs, path):
+    with jsonlines.open(path, mode="w") as writer:
+        for obj in objs:
+            writer.write(obj)
+
+
+def read_with_jsonlines(path):
+    with jsonlines.open(path) as reader:
+        return [obj for obj in reader]
+
+
+CODECS = {
+    "jsonlines": (write_with_jsonlines, read_with_jsonlines, ".jsonl"),
+    "orjson": (write_jsonl, read_jsonl, ".jsonl"),
+    "orjson+zstd": (write_jsonl, read_jsonl, ".jsonl.zst"),
+}
+
+
+def time_codec(objs, write, read, path):
+    start = time.perf_counter()
+    write(objs, path)
+    write_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    read(path)
+    read_time = time.perf_counter() - start
+
+    return write_time, read_time, os.path.getsize(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="JSONL codec throughput and size")
+    parser.add_argument("--input", default="data/output/results_10k.jsonl")
+    args = parser.parse_args()
+
+    objs = read_jsonl(args.input)
+    input_mb = os.path.getsize(args.input) / 1e6
+    print(f"{len(objs)} records, {input_mb:.1f} MB")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for name, (write, read, extension) in CODECS.items():
+            path = os.path.join(temp_dir, name + extension)
+            write_time, read_time, size = time_codec(objs, write, read, path)
+
+            print(
+                f"{name}: write = {input_mb / write_time:.1f} MB/s | "
+                f"read = {input_mb / read_time:.1f} MB/s | "
+                f"size = {size / 1e6:.1f} MB"
+            )
@@ -0,0 +1,54 @@
+import argparse
+import json
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from ..entity_processing.recognition import get_articles
+
+
+def post_article(url, article):
+    """Posts an article to the NER server and returns the latency in seconds."""
+    body = json.dumps({"id": article["id"], "text": article["text"]}).encode("utf-8")
+    request = urllib.request.Request(
+        url + "/ner", data=body, headers={"Content-Type": "application/json"}
+    )
+
+    start = time.perf_counter()
+    with urllib.request.urlopen(request) as response:
+        response.read()
+
+    return time.perf_counter() - start
+
+
+def generate_load(url, articles, concurrency):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        latencies = list(executor.map(lambda a: post_article(url, a), articles))
+    elapsed = time.perf_counter() - start
+
+    latencies = np.array(latencies) * 1000
+    print(
+        f"Concurrency {concurrency}: {len(articles) / elapsed:.1f} requests/s | "
+        f"p50 = {np.percentile(latencies, 50):.1f} ms | "
+        f"p99 = {np.percentile(latencies, 99):.1f} ms"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load generator for the NER server")
+    parser.add_argument("--url", default="http://127.0.0.1:8080")
+    parser.add_argument("--articles", default="data/input/articles_tt_new.jsonl")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    args = parser.parse_args()
+
+    articles = get_articles(args.articles)[: args.requests]
+
+    for concurrency in args.concurrency:
+        generate_load(args.url, articles, concurrency)
+
+    with urllib.request.urlopen(args.url + "/metrics") as response:
+        print("Server metrics:", json.loads(response.read()))
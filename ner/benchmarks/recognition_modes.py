@@ -0,0 +1,163 @@
+import math
+import os
+import random
+import time
+from collections import Counter
+
+from ..entity_processing.batching import (
+    BatchStats,
+    encode_sentence,
+    max_sequence_length,
+    pack_sequences,
+)
+from ..entity_processing.recognition import (
+    PUNCTUATION,
+    extract_sentences,
+    get_articles,
+    load_pipeline,
+    recognize_entities,
+)
+
+
+def get_sentences(articles):
+    return [extract_sentences(article, PUNCTUATION)[0] for article in articles]
+
+
+def count_sentences(articles):
+    return sum(len(sentences) for sentences in get_sentences(articles))
+
+
+def count_packed_sequences(articles, nlp):
+    """Returns the number of sequences the model is run on when packing sentences."""
+    max_length = max_sequence_length(nlp)
+    sequences, groups = [], []
+
+    for i, sentences in enumerate(get_sentences(articles)):
+        for sentence in sentences:
+            ids = encode_sentence(nlp.tokenizer, sentence)
+            # Like in iterate_entities, the sentences of an article are tagged up to
+            # the first one that is too long, which omits the article
+            if len(ids) > max_length:
+                break
+
+            sequences += [ids]
+            groups += [i]
+
+    return len(pack_sequences(sequences, groups, max_length)[0])
+
+
+def time_recognition(articles, nlp, **kwargs):
+    """Returns the output of recognize_entities and the number of seconds it took."""
+    start = time.perf_counter()
+    entities, omitted = recognize_entities(articles, nlp=nlp, **kwargs)
+
+    return entities, omitted, time.perf_counter() - start
+
+
+def compare_outputs(reference, candidate, tolerance=1e-4):
+    """Counts the articles whose entities differ between two runs, allowing the
+    scores to differ by at most tolerance.
+    """
+    no_differing = 0
+
+    for ref, cand in zip(reference, candidate):
+        ref_ents, cand_ents = ref["entities"], cand["entities"]
+        same = len(ref_ents) == len(cand_ents) and all(
+            r["word"] == c["word"]
+            and r["entity"] == c["entity"]
+            and math.isclose(r["score"], c["score"], abs_tol=tolerance)
+            for r, c in zip(ref_ents, cand_ents)
+        )
+        no_differing += not same
+
+    return no_differing
+
+
+def entity_agreement(reference, candidate):
+    """Returns the shares of (word, type) entities found in one run that are also
+    found in the other, counted per article.
+    """
+    no_common, no_reference, no_candidate = 0, 0, 0
+
+    for ref, cand in zip(reference, candidate):
+        ref_ents = Counter((e["word"], e["entity"]) for e in ref["entities"])
+        cand_ents = Counter((e["word"], e["entity"]) for e in cand["entities"])
+
+        no_common += sum((ref_ents & cand_ents).values())
+        no_reference += sum(ref_ents.values())
+        no_candidate += sum(cand_ents.values())
+
+    return no_common / max(no_reference, 1), no_common / max(no_candidate, 1)
+
+
+if __name__ == "__main__":
+    articles = get_articles("data/input/articles_tt_new.jsonl")
+    random.seed(1234567890)
+    articles = random.sample(articles, min(200, len(articles)))
+    no_sentences = count_sentences(articles)
+
+    nlp = load_pipeline()
+
+    serial, serial_omitted, serial_time = time_recognition(articles, nlp)
+    print(f"Per-sentence: {no_sentences / serial_time:.1f} sentences/s")
+
+    for batch_size in [8, 32, 64]:
+        batched, batched_omitted, batched_time = time_recognition(
+            articles, nlp, batch_size=batch_size
+        )
+        no_differing = compare_outputs(serial, batched)
+        same_omitted = serial_omitted == batched_omitted
+
+        print(
+            f"Batched ({batch_size}): {no_sentences / batched_time:.1f} sentences/s | "
+            f"speedup = {serial_time / batched_time:.2f}x | "
+            f"differing articles = {no_differing} | same omitted = {same_omitted}"
+        )
+
+    # Parity check of packed against unpacked sentences
+    packed, packed_omitted, packed_time = time_recognition(
+        articles, nlp, batch_size=8, pack=True
+    )
+    no_sequences = count_packed_sequences(articles, nlp)
+    no_differing = compare_outputs(serial, packed)
+    recall, precision = entity_agreement(serial, packed)
+
+    print(
+        f"Packed (8): {no_sentences / packed_time:.1f} sentences/s | "
+        f"sequences = {no_sequences} instead of {no_sentences} | "
+        f"differing articles = {no_differing} | "
+        f"entities kept = {recall:.4f} | entities agreeing = {precision:.4f}"
+    )
+
+    # Padding with and without length bucketing
+    for bucket_window in [None, 256]:
+        stats = BatchStats()
+        bucketed, _, bucketed_time = time_recognition(
+            articles, nlp, batch_size=32, bucket_window=bucket_window, stats=stats
+        )
+        print(
+            f"Bucket window {bucket_window}: "
+            f"{no_sentences / bucketed_time:.1f} sentences/s | "
+            f"padding ratio = {stats.padding_ratio():.3f} | "
+            f"effective tokens/s = {stats.tokens_per_second():.1f} | "
+            f"differing articles = {compare_outputs(serial, bucketed)}"
+        )
+
+    # Pipelined stages, with the cores shared between PyTorch and the tokenizers
+    for tokenizer_threads in [1, 2, 4]:
+        torch_threads = max(1, os.cpu_count() - tokenizer_threads - 1)
+        pipelined, pipelined_omitted, pipelined_time = time_recognition(
+            articles,
+            nlp,
+            batch_size=32,
+            tokenizer_threads=tokenizer_threads,
+            torch_threads=torch_threads,
+        )
+        print(
+            f"Pipelined ({tokenizer_threads} tokenizer, "
+            f"{torch_threads} torch threads): "
+            f"{no_sentences / pipelined_time:.1f} sentences/s | "
+            f"speedup = {serial_time / pipelined_time:.2f}x | "
+            f"differing articles = {compare_outputs(serial, pipelined)} | "
+            f"same omitted = {serial_omitted == pipelined_omitted}"
+        )
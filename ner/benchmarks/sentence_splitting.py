@@ -0,0 +1,57 @@
+import re
+import timeit
+from string import punctuation
+
+from ..entity_processing.recognition import (
+    PUNCTUATION,
+    extract_sentences,
+    get_articles,
+)
+
+
+def extract_sentences_per_regex(article, punct):
+    """The previous approach, running re.findall over the text and re.search over
+    every sentence, kept as a reference.
+    """
+    text = article["text"].replace("\n\n", ".")
+    sentences = re.findall(".*?[.?!]", text)
+    input_sentences = []
+
+    for sentence in sentences:
+        if re.search("<.*>", sentence):
+            return input_sentences, True
+
+        input_sentence = sentence.strip()
+        if not input_sentence or input_sentence in punct:
+            continue
+
+        input_sentences += [input_sentence]
+
+    return input_sentences, False
+
+
+if __name__ == "__main__":
+    articles = get_articles("data/input/articles_tt_new.jsonl")
+
+    for extract in [extract_sentences_per_regex, extract_sentences]:
+        elapsed = min(
+            timeit.repeat(
+                lambda: [extract(article, PUNCTUATION) for article in articles],
+                number=1,
+                repeat=5,
+            )
+        )
+        print(f"{extract.__name__}: {len(articles) / elapsed:.0f} articles/s")
+
+    no_recovered, no_skipped = 0, 0
+    for article in articles:
+        old_sentences, old_omit = extract_sentences_per_regex(article, PUNCTUATION)
+        new_sentences, new_omit = extract_sentences(article, PUNCTUATION)
+
+        if new_omit:
+            no_skipped += len(old_sentences)
+        else:
+            no_recovered += len(new_sentences) - len(old_sentences)
+
+    print(f"{no_recovered} sentences without terminal punctuation recovered")
+    print(f"{no_skipped} sentences of HTML articles no longer inputted to the model")
@@ -0,0 +1,157 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import tempfile
+import time
+from datetime import datetime
+from multiprocessing import get_context
+
+import torch
+import transformers
+
+from ..entity_processing.offset_grouping import OffsetGrouper
+from ..entity_processing.recognition import (
+    PUNCTUATION,
+    get_articles,
+    recognize_entities,
+)
+from ..utils.file_handling import write_output_to_file
+from .grouping_engines import group_by_offsets, group_by_tokens, tag_articles
+from .recognition_modes import count_sentences
+from .synthetic_corpus import generate_corpus
+from .tiny_model import build_tiny_model, load_tiny_fast_tokenizer, load_tiny_pipeline
+
+MODES = {
+    "serial": {},
+    "batched": {"batch_size": 32},
+    "bucketed": {"batch_size": 32, "bucket_window": 512},
+    "packed": {"batch_size": 8, "pack": True},
+    "pipelined": {"batch_size": 32, "tokenizer_threads": 2},
+}
+
+
+def peak_rss_mb():
+    """Peak resident set size of the current process, in MB (Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _run_mode(model_dir, corpus_path, kwargs):
+    nlp = load_tiny_pipeline(model_dir)
+    articles = get_articles(corpus_path)
+    no_sentences = count_sentences(articles)
+    rss_before = peak_rss_mb()
+
+    start = time.perf_counter()
+    recognize_entities(articles, nlp=nlp, **kwargs)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "seconds": elapsed,
+        "articles_per_second": len(articles) / elapsed,
+        "sentences_per_second": no_sentences / elapsed,
+        "peak_rss_mb": peak_rss_mb(),
+        "peak_rss_before_run_mb": rss_before,
+    }
+
+
+def _run_grouping(model_dir, corpus_path):
+    nlp = load_tiny_pipeline(model_dir)
+    articles = get_articles(corpus_path)
+    grouper = OffsetGrouper(nlp, load_tiny_fast_tokenizer(model_dir), PUNCTUATION)
+
+    tagged = tag_articles(articles, nlp, grouper, PUNCTUATION)
+    no_sentences = sum(len(sentences) for sentences in tagged)
+    results = {}
+
+    for name, group in [
+        ("group_entities", lambda: group_by_tokens(tagged, nlp, PUNCTUATION)),
+        ("offset_grouper", lambda: group_by_offsets(tagged, grouper)),
+    ]:
+        start = time.perf_counter()
+        group()
+        elapsed = time.perf_counter() - start
+        results[name] = {
+            "seconds": elapsed,
+            "sentences_per_second": no_sentences / elapsed,
+        }
+
+    return results
+
+
+def run_isolated(function, *args):
+    """Runs a function in a fresh process, so that its peak RSS is its own."""
+    with get_context("spawn").Pool(1) as pool:
+        return pool.apply(function, args)
+
+
+def run_suite(corpus_options, modes, output_path):
+    results = {}
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        model_dir = os.path.join(temp_dir, "model")
+        corpus_path = os.path.join(temp_dir, "corpus.jsonl")
+
+        build_tiny_model(model_dir, corpus_options["entity_density"])
+        write_output_to_file(generate_corpus(**corpus_options), corpus_path)
+
+        for mode in modes:
+            print(f"Benchmarking {mode}…")
+            results[mode] = run_isolated(_run_mode, model_dir, corpus_path, MODES[mode])
+
+        if "serial" in results:
+            for mode in modes:
+                speedup = results["serial"]["seconds"] / results[mode]["seconds"]
+                results[mode]["speedup_vs_serial"] = speedup
+
+        print("Benchmarking grouping…")
+        results["grouping"] = run_isolated(_run_grouping, model_dir, corpus_path)
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "environment": {
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "transformers": transformers.__version__,
+            "cpu_count": os.cpu_count(),
+            "torch_threads": torch.get_num_threads(),
+        },
+        "corpus": corpus_options,
+        "results": results,
+    }
+
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    with open(output_path, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(json.dumps(results, indent=2))
+    print(f"Results written to {output_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline NER throughput benchmarks")
+    parser.add_argument("--articles", type=int, default=1000)
+    parser.add_argument("--sentences-per-article", type=int, default=15)
+    parser.add_argument("--mean-sentence-length", type=float, default=14)
+    parser.add_argument("--sigma", type=float, default=0.5)
+    parser.add_argument("--entity-density", type=float, default=0.1)
+    parser.add_argument("--subword-rate", type=float, default=0.3)
+    parser.add_argument("--unk-rate", type=float, default=0.01)
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES))
+    parser.add_argument(
+        "--output",
+        default=f"data/benchmarks/ner_{datetime.now():%Y-%m-%d_%H%M%S}.json",
+    )
+    args = parser.parse_args()
+
+    corpus_options = {
+        "no_articles": args.articles,
+        "sentences_per_article": args.sentences_per_article,
+        "mean_sentence_length": args.mean_sentence_length,
+        "sigma": args.sigma,
+        "entity_density": args.entity_density,
+        "subword_rate": args.subword_rate,
+        "unk_rate": args.unk_rate,
+    }
+    run_suite(corpus_options, args.modes, args.output)
@@ -0,0 +1,111 @@
+import random
+
+# fmt: off
+FUNCTION_WORDS = [
+    "och", "i", "att", "det", "som", "en", "på", "är", "av", "för", "med", "till",
+    "den", "har", "de", "inte", "om", "ett", "men", "var", "från", "kan", "nu",
+    "efter", "under", "när", "också", "mot", "enligt", "vid",
+]
+CONTENT_WORDS = [
+    "regeringen", "polisen", "kommunen", "året", "dagen", "veckan", "beslutet",
+    "frågan", "landet", "staden", "laget", "matchen", "priset", "marknaden",
+    "skolan", "vården", "budgeten", "rapporten", "vägen", "bilen", "huset",
+    "företaget", "säger", "meddelar", "uppger", "vann", "förlorade", "besökte",
+    "kritiserar", "föreslår", "ökar", "minskar", "stora", "nya", "flera",
+    "miljoner", "kronor", "procent", "personer", "tidigare",
+]
+ENTITIES = {
+    "PER": [
+        "Anna Andersson", "Erik Johansson", "Magdalena Andersson", "Lars Olsson",
+        "Greta Thunberg", "Karin Nilsson", "Per Svensson", "Maria Larsson",
+    ],
+    "LOC": [
+        "Stockholm", "Göteborg", "Malmö", "Uppsala", "Sundsvall", "Kiruna",
+        "Sverige", "Norge", "Östersund", "Sankt Göran",
+    ],
+    "ORG": [
+        "Volvo", "Ericsson", "Socialdemokraterna", "Riksbanken", "SVT",
+        "Skatteverket", "Region Stockholm", "Svenska Dagbladet",
+    ],
+    "TME": ["måndag", "tisdag", "januari", "februari", "sommaren"],
+}
+# fmt: on
+# Suffixes only present in the vocabulary as subwords, e.g. Stockholm + ##s
+SUFFIXES = ["s", "borna", "området", "bolaget"]
+# Characters missing from the vocabulary, which are tokenized as [UNK]
+UNKNOWN_CHARACTERS = ["ć", "Ø", "✓", "ñ"]
+
+
+def build_vocabulary():
+    """Returns the WordPiece vocabulary covering every word of the corpus."""
+    special = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"]
+    words = set(FUNCTION_WORDS + CONTENT_WORDS)
+    for names in ENTITIES.values():
+        for name in names:
+            words.update(name.split())
+
+    punct = list(".,?!:;-\"'()")
+    subwords = ["##" + suffix for suffix in SUFFIXES]
+
+    return special + sorted(words) + punct + subwords
+
+
+def generate_sentence(rng, mean_length, sigma, entity_density, subword_rate, unk_rate):
+    """Generates a sentence of a log-normally distributed number of words."""
+    no_words = max(2, int(rng.lognormvariate(0, sigma) * mean_length))
+    words = []
+
+    while len(words) < no_words:
+        if rng.random() < entity_density:
+            word = rng.choice(ENTITIES[rng.choice(list(ENTITIES))])
+            if rng.random() < subword_rate:
+                word += rng.choice(SUFFIXES)
+        elif rng.random() < 0.4:
+            word = rng.choice(FUNCTION_WORDS)
+        else:
+            word = rng.choice(CONTENT_WORDS)
+
+        if rng.random() < unk_rate:
+            word += rng.choice(UNKNOWN_CHARACTERS)
+        if rng.random() < 0.05:
+            word += ","
+
+        words += [word]
+
+    sentence = " ".join(words)
+    return sentence[0].upper() + sentence[1:] + rng.choice([".", ".", ".", "?", "!"])
+
+
+def generate_corpus(
+    no_articles=1000,
+    sentences_per_article=15,
+    mean_sentence_length=14,
+    sigma=0.5,
+    entity_density=0.1,
+    subword_rate=0.3,
+    unk_rate=0.01,
+    seed=1234567890,
+):
+    """Generates Swedish-like news articles in the input format of recognition.py.
+
+    Sentence lengths in words are log-normally distributed around
+    mean_sentence_length. entity_density is the share of words that are entity
+    names, subword_rate the share of entity names given a suffix that is tokenized
+    as a subword, and unk_rate the share of words with an unknown character.
+    Every article starts with a headline paragraph.
+    """
+    rng = random.Random(seed)
+    rates = (entity_density, subword_rate, unk_rate)
+    articles = []
+
+    for i in range(no_articles):
+        headline = generate_sentence(rng, 6, 0.3, *rates)[:-1]
+        no_sentences = max(1, int(rng.gauss(sentences_per_article, 5)))
+        body = " ".join(
+            generate_sentence(rng, mean_sentence_length, sigma, *rates)
+            for _ in range(no_sentences)
+        )
+
+        articles += [{"id": f"synthetic-{i}", "text": headline + "\n\n" + body}]
+
+    return articles
@@ -0,0 +1,66 @@
+import math
+import os
+
+import torch
+from transformers import (
+    BertConfig,
+    BertForTokenClassification,
+    BertTokenizer,
+    BertTokenizerFast,
+    pipeline,
+)
+
+from .synthetic_corpus import build_vocabulary
+
+LABELS = ["O", "PER", "LOC", "ORG", "TME", "MSR", "EVN", "WRK", "OBJ"]
+
+
+def build_tiny_model(model_dir, entity_density=0.1, seed=1234567890):
+    """Creates a tiny, randomly initialised BERT token classifier with a vocabulary
+    covering the synthetic corpus and saves it to model_dir, so that benchmarks can
+    run without downloading the real model.
+
+    The classifier bias is set so that roughly entity_density of the tokens are
+    predicted to be entities, giving group_entities a realistic amount of work.
+    """
+    os.makedirs(model_dir, exist_ok=True)
+    with open(os.path.join(model_dir, "vocab.txt"), "w") as f:
+        f.write("\n".join(build_vocabulary()) + "\n")
+
+    tokenizer = BertTokenizer(
+        os.path.join(model_dir, "vocab.txt"), do_lower_case=False
+    )
+
+    torch.manual_seed(seed)
+    config = BertConfig(
+        vocab_size=tokenizer.vocab_size,
+        hidden_size=64,
+        num_hidden_layers=2,
+        num_attention_heads=2,
+        intermediate_size=128,
+        max_position_embeddings=512,
+        # Not derived from id2label by the transformers version used, which would
+        # leave the default of two labels
+        num_labels=len(LABELS),
+        id2label=dict(enumerate(LABELS)),
+        label2id={label: i for i, label in enumerate(LABELS)},
+    )
+    model = BertForTokenClassification(config)
+
+    no_entity_labels = len(LABELS) - 1
+    with torch.no_grad():
+        model.classifier.bias.zero_()
+        model.classifier.bias[0] = math.log(
+            (1 - entity_density) * no_entity_labels / entity_density
+        )
+
+    model.save_pretrained(model_dir)
+    tokenizer.save_pretrained(model_dir)
+
+
+def load_tiny_pipeline(model_dir):
+    return pipeline("ner", model=model_dir, tokenizer=model_dir)
+
+
+def load_tiny_fast_tokenizer(model_dir):
+    return BertTokenizerFast(os.path.join(model_dir, "vocab.txt"), do_lower_case=False)
@@ -1,8 +1,12 @@
+import argparse
+
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 from sklearn.linear_model import LinearRegression
 
-from ..utils.file_handling import write_df_to_file, read_df_from_file
+from ..utils.file_handling import dataset_paths, read_df_from_file, write_df_to_file
+from .incidence import category_entity_counts
 
 
 def linear_regression(x_df, y_df):
@@ -48,48 +52,44 @@ def create_category_df(articles):
 
 
 def link_entities_to_categories(entities, categories):
-    categories["no_uses"] = categories["article_ids"].str.len()
-
-    entity_column = []
-    for i in categories.index:
-        ents, cnts = [], []
+    """Pairs every category with the (count, entity) pairs of the entities found in
+    its articles, sorted in descending order.
 
-        for aid in categories["article_ids"][i]:
-            filtered = entities[entities["article_ids"].apply(lambda x: aid in x)]
+    The counts are computed as a single product of sparse article × category and
+    article × entity matrices instead of scanning the entities for every article.
+    """
+    categories["no_uses"] = categories["article_ids"].str.len()
 
-            for j in filtered.index:
-                ent = filtered["word"][j]
-                cnt = filtered["article_ids"][j].count(aid)
+    counts, words = category_entity_counts(categories, entities)
 
-                if ent in ents:
-                    cnts[ents.index(ent)] += cnt
-                else:
-                    ents += [ent]
-                    cnts += [cnt]
+    entity_column = []
+    for i in range(counts.shape[0]):
+        row = slice(counts.indptr[i], counts.indptr[i + 1])
+        cnts = counts.data[row].tolist()
+        ents = words[counts.indices[row]].tolist()
 
         entity_column += [sorted(zip(cnts, ents), reverse=True)]
 
     categories["entities"] = entity_column
     categories["no_unique_entities"] = categories["entities"].str.len()
-
-    tot_no_column = []
-
-    for i in categories.index:
-        tot_no_column += [0]
-
-        for entity in categories["entities"][i]:
-            if entity:
-                tot_no_column[-1] += entity[0]
-
-    categories["tot_no_entities"] = tot_no_column
+    categories["tot_no_entities"] = np.asarray(counts.sum(axis=1)).ravel()
 
     return categories
 
 
 if __name__ == "__main__":
-    articles = read_df_from_file("data/dataframes/articles_10k_df.jsonl")
-    all_entities = read_df_from_file("data/dataframes/all_entities_10k_df.jsonl")
-    merged_entities = read_df_from_file("data/dataframes/merged_entities_10k_df.jsonl")
+    parser = argparse.ArgumentParser(description="Analyzes the entities of a dataset")
+    parser.add_argument("--dataset", default="10k")
+    paths = dataset_paths(parser.parse_args().dataset)
+
+    # Only the columns used here are read from the memory-mapped files
+    articles = read_df_from_file(
+        paths["articles_df"], ["id", "brand", "tags", "content_text"]
+    )
+    all_entities = read_df_from_file(paths["all_entities_df"], ["article_id"])
+    merged_entities = read_df_from_file(
+        paths["merged_entities_df"], ["word", "article_ids", "no_occurrences"]
+    )
 
     # Visualize how many entities occur x number of times
     count = pd.DataFrame(merged_entities.groupby("no_occurrences").size()).reset_index()
@@ -97,18 +97,12 @@ if __name__ == "__main__":
     count = count[count["no_entities"] > 1]
 
     # Visualize the relationship between text length and the number of entities found (per article)
-    per_article_list = []
-    grouped_entities = all_entities.groupby(["article_id"]).count().reset_index()
+    entity_counts = all_entities.groupby("article_id", observed=True).size()
+    entity_counts.index = entity_counts.index.astype(articles["id"].dtype)
+    no_entities = articles["id"].map(entity_counts).fillna(0).astype(int)
+    article_len = articles["content_text"].str.len()
 
-    for i in articles.index:
-        no_entities = grouped_entities[
-            grouped_entities["article_id"] == articles["id"][i]
-        ]
-        no_entities = no_entities["index"].item() if len(no_entities) > 0 else 0
-        article_len = len(articles["content_text"][i])
-        per_article_list += [{"no_entities": no_entities, "article_len": article_len}]
-
-    per_article = pd.DataFrame(per_article_list)
+    per_article = pd.DataFrame({"no_entities": no_entities, "article_len": article_len})
     per_article = per_article.sort_values(by=["no_entities"], ascending=False)
 
     f1 = plt.figure(1)
@@ -134,4 +128,4 @@ if __name__ == "__main__":
     categories.hist(bins=70)
     plt.show()
 
-    write_df_to_file(categories, "data/dataframes/categories_10k_df.jsonl")
+    write_df_to_file(categories, paths["categories_df"])
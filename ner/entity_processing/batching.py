@@ -0,0 +1,248 @@
+import time
+
+import numpy as np
+import torch
+
+
+def encode_sentence(tokenizer, sentence):
+    """Encodes a sentence exactly like the NER pipeline does before its forward pass."""
+    encoded = tokenizer.encode_plus(
+        sentence, return_attention_mask=False, max_length=tokenizer.max_len
+    )
+
+    return encoded["input_ids"]
+
+
+def max_sequence_length(nlp):
+    """Returns the longest sequence the model can embed. Longer sequences cause the
+    IndexError that recognize_entities uses to omit articles.
+    """
+    return nlp.model.config.max_position_embeddings
+
+
+def create_batches(lengths, batch_size, max_tokens=None):
+    """Splits sequence indexes into consecutive batches, bounded by the number of
+    sequences and, optionally, by the number of tokens after padding.
+    """
+    batches = []
+    batch, longest = [], 0
+
+    for i, length in enumerate(lengths):
+        padded = max(longest, length) * (len(batch) + 1)
+        too_many_tokens = max_tokens is not None and padded > max_tokens
+
+        if batch and (len(batch) == batch_size or too_many_tokens):
+            batches += [batch]
+            batch, longest = [], 0
+
+        batch += [i]
+        longest = max(longest, length)
+
+    if batch:
+        batches += [batch]
+
+    return batches
+
+
+def create_bucketed_batches(lengths, batch_size, max_tokens=None, window=None):
+    """Like create_batches, but sorts every window of consecutive sequences by
+    length first, so that sequences of similar lengths end up in the same batches
+    and little compute is spent on padding.
+    """
+    window = window or len(lengths)
+    batches = []
+
+    for start in range(0, len(lengths), window):
+        end = min(start + window, len(lengths))
+        order = sorted(range(start, end), key=lengths.__getitem__)
+        sorted_lengths = [lengths[i] for i in order]
+
+        for batch in create_batches(sorted_lengths, batch_size, max_tokens):
+            batches += [[order[i] for i in batch]]
+
+    return batches
+
+
+class BatchStats:
+    """Accumulates the padding and throughput statistics of batched forward passes."""
+
+    def __init__(self):
+        self.no_batches = 0
+        self.no_tokens = 0
+        self.no_padded_tokens = 0
+        self.forward_time = 0.0
+
+    def add(self, lengths, elapsed):
+        self.no_batches += 1
+        self.no_tokens += sum(lengths)
+        self.no_padded_tokens += max(lengths) * len(lengths)
+        self.forward_time += elapsed
+
+    def padding_ratio(self):
+        """The share of the processed tokens that are padding."""
+        return 1 - self.no_tokens / max(self.no_padded_tokens, 1)
+
+    def tokens_per_second(self):
+        """The number of tokens, not counting padding, processed per second."""
+        return self.no_tokens / max(self.forward_time, 1e-9)
+
+    def print_stats(self):
+        print(
+            f"{self.no_batches} batches | padding ratio = {self.padding_ratio():.3f} | "
+            f"effective tokens/s = {self.tokens_per_second():.1f}"
+        )
+
+
+def forward(nlp, sequences, backend=None):
+    """Runs one forward pass over a padded batch of token id sequences and returns
+    the logits of every sequence, stripped of padding.
+
+    The forward pass is run by the pipeline's PyTorch model, unless a backend is
+    given: a callable taking input ids and an attention mask and returning logits.
+    """
+    longest = max(len(ids) for ids in sequences)
+    pad_id = nlp.tokenizer.pad_token_id
+
+    input_ids = np.full((len(sequences), longest), pad_id, dtype=np.int64)
+    attention_mask = np.zeros((len(sequences), longest), dtype=np.int64)
+    for i, ids in enumerate(sequences):
+        input_ids[i, : len(ids)] = ids
+        attention_mask[i, : len(ids)] = 1
+
+    if backend:
+        logits = backend(input_ids, attention_mask)
+    else:
+        with nlp.device_placement():
+            with torch.no_grad():
+                tensors = nlp.ensure_tensor_on_device(
+                    input_ids=torch.from_numpy(input_ids),
+                    attention_mask=torch.from_numpy(attention_mask),
+                    token_type_ids=torch.zeros_like(torch.from_numpy(input_ids)),
+                )
+                logits = nlp.model(**tensors)[0].cpu().numpy()
+
+    return [logits[i, : len(ids)] for i, ids in enumerate(sequences)]
+
+
+def decode_entities(nlp, input_ids, logits):
+    """Turns the logits of a sequence into the same token dicts as the NER pipeline."""
+    score = np.exp(logits) / np.exp(logits).sum(-1, keepdims=True)
+    labels_idx = score.argmax(axis=-1)
+    id2label = nlp.model.config.id2label
+
+    entities = []
+    for idx, label_idx in enumerate(labels_idx):
+        label = id2label[label_idx]
+        if label in nlp.ignore_labels:
+            continue
+
+        entities += [
+            {
+                "word": nlp.tokenizer.convert_ids_to_tokens(int(input_ids[idx])),
+                "score": score[idx][label_idx].item(),
+                "entity": label,
+                "index": idx,
+            }
+        ]
+
+    return entities
+
+
+def forward_all(
+    nlp,
+    sequences,
+    batch_size,
+    max_tokens=None,
+    backend=None,
+    bucket_window=None,
+    stats=None,
+):
+    """Runs token id sequences through the model in padded batches and returns their
+    logits in the order the sequences were given.
+
+    If bucket_window is given, the sequences are batched by length within windows of
+    that many sequences. If a BatchStats is given, every forward pass is added to it.
+    """
+    all_logits = [None] * len(sequences)
+    lengths = [len(ids) for ids in sequences]
+
+    if bucket_window:
+        batches = create_bucketed_batches(
+            lengths, batch_size, max_tokens, bucket_window
+        )
+    else:
+        batches = create_batches(lengths, batch_size, max_tokens)
+
+    for batch in batches:
+        start = time.perf_counter()
+        batch_logits = forward(nlp, [sequences[i] for i in batch], backend)
+
+        if stats:
+            stats.add([lengths[i] for i in batch], time.perf_counter() - start)
+
+        for i, logits in zip(batch, batch_logits):
+            all_logits[i] = logits
+
+    return all_logits
+
+
+def tag_sequences(nlp, sequences, batch_size, **kwargs):
+    """Tags encoded sentences in padded batches and returns one list of token dicts
+    per sentence, in the order the sentences were given. Keyword arguments are passed
+    on to forward_all.
+    """
+    all_logits = forward_all(nlp, sequences, batch_size, **kwargs)
+
+    return [
+        decode_entities(nlp, ids, logits) for ids, logits in zip(sequences, all_logits)
+    ]
+
+
+def pack_sequences(sequences, groups, max_length):
+    """Concatenates consecutive encoded sentences of the same group (article) into
+    sequences of at most max_length tokens, with one [CLS] and [SEP] token each.
+
+    Returns the packed sequences and, for each of them, the spans (sentence index,
+    start, end) locating the tokens of every sentence in the packed sequence.
+    """
+    packed, spans = [], []
+    previous_group = None
+
+    for i, (ids, group) in enumerate(zip(sequences, groups)):
+        body = ids[1:-1]
+        fits = packed and len(packed[-1]) + len(body) <= max_length
+
+        if group != previous_group or not fits:
+            packed += [ids[:1] + ids[-1:]]
+            spans += [[]]
+            previous_group = group
+
+        start = len(packed[-1]) - 1
+        packed[-1][start:start] = body
+        spans[-1] += [(i, start, start + len(body))]
+
+    return packed, spans
+
+
+def tag_packed_sequences(nlp, sequences, groups, batch_size, **kwargs):
+    """Tags encoded sentences packed per group into sequences of the model's max
+    length, and returns one list of token dicts per sentence. Keyword arguments are
+    passed on to forward_all.
+
+    The logits of every sentence are cut out of its packed sequence and framed by
+    the logits of the packed [CLS] and [SEP] tokens, so that token indexes are the
+    same as when sentences are tagged one by one. The predictions may still differ,
+    since every sentence is seen in the context of its neighbours.
+    """
+    packed, spans = pack_sequences(sequences, groups, max_sequence_length(nlp))
+    packed_logits = forward_all(nlp, packed, batch_size, **kwargs)
+    tagged = [None] * len(sequences)
+
+    for logits, packed_spans in zip(packed_logits, spans):
+        for i, start, end in packed_spans:
+            sentence_logits = np.concatenate(
+                [logits[:1], logits[start:end], logits[-1:]]
+            )
+            tagged[i] = decode_entities(nlp, sequences[i], sentence_logits)
+
+    return tagged
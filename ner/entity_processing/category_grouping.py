@@ -1,8 +1,9 @@
+import argparse
 from collections import Counter
 
 import pandas as pd
 
-from ..utils.file_handling import write_df_to_file, read_df_from_file
+from ..utils.file_handling import dataset_paths, read_df_from_file, write_df_to_file
 from .analysis import link_entities_to_categories
 
 
@@ -50,12 +51,17 @@ def link_categories_to_entities(articles, entities):
     return pd.DataFrame(linked)
 
 
-articles = read_df_from_file("data/dataframes/articles_tt_new_df.jsonl")
-merged_entities = read_df_from_file("data/dataframes/merged_entities_tt_new_df.jsonl")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Groups the entities of TT articles")
+    parser.add_argument("--dataset", default="tt_new")
+    paths = dataset_paths(parser.parse_args().dataset)
 
-categories = create_category_df(articles)
-categories = link_entities_to_categories(merged_entities, categories)
-lookup = link_categories_to_entities(articles, merged_entities)
+    articles = read_df_from_file(paths["articles_df"])
+    merged_entities = read_df_from_file(paths["merged_entities_df"])
 
-# write_df_to_file(categories, "data/dataframes/categories_tt_new_df.jsonl")
-# write_df_to_file(lookup, "data/dataframes/tt_entity_lookup_df.jsonl")
+    categories = create_category_df(articles)
+    categories = link_entities_to_categories(merged_entities, categories)
+    lookup = link_categories_to_entities(articles, merged_entities)
+
+    # write_df_to_file(categories, paths["categories_df"])
+    # write_df_to_file(lookup, "data/dataframes/tt_entity_lookup_df.jsonl")
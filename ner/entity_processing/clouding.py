@@ -5,10 +5,12 @@ import matplotlib.pyplot as plt
 from PIL import Image
 from wordcloud import WordCloud, ImageColorGenerator
 
-from ..utils.file_handling import read_df_from_file
+from ..utils.file_handling import dataset_paths, read_df_from_file
 
 
-entities = read_df_from_file("data/dataframes/merged_entities_10k_df.jsonl")
+entities = read_df_from_file(
+    dataset_paths("10k")["merged_entities_df"], ["word", "no_occurrences"]
+)
 entities_duplicated = []
 
 for i in entities.index:
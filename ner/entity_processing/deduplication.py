@@ -0,0 +1,257 @@
+import re
+import time
+import zlib
+
+import numpy as np
+
+# Abbreviations written out before comparing, e.g. "S:t Göran" and "Sankt Göran"
+ABBREVIATIONS = [
+    (re.compile(r"\bs:t\b\.?"), "sankt"),
+    (re.compile(r"\bs:ta\b\.?"), "sankta"),
+]
+GENITIVE_PATTERN = re.compile(r"[:’']s\b")
+NON_ALPHANUMERIC_PATTERN = re.compile(r"[^\w]+")
+# A Mersenne prime larger than the 32-bit n-gram hashes
+PRIME = (1 << 61) - 1
+# Pairs are only compared exactly if their estimated similarity is at most this
+# far below the threshold, since the estimate is off by about 0.06 with 48
+# permutations
+ESTIMATE_MARGIN = 0.2
+
+
+def normalise(word):
+    """Returns the key of a word that spelling variants are compared on: lowercased,
+    with abbreviations written out and genitive suffixes and punctuation removed.
+    """
+    key = word.lower()
+    for pattern, replacement in ABBREVIATIONS:
+        key = pattern.sub(replacement, key)
+    key = GENITIVE_PATTERN.sub("", key)
+
+    return NON_ALPHANUMERIC_PATTERN.sub(" ", key).strip()
+
+
+def ngrams(key, n=3):
+    padded = f" {key} "
+    return {padded[i : i + n] for i in range(max(len(padded) - n + 1, 1))}
+
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b)
+
+
+def minhash_signatures(gram_sets, no_permutations, seed=1234567890):
+    """Computes the MinHash signatures of sets of n-grams, all at once with numpy.
+
+    Returns an array of one row of no_permutations minimum hash values per set,
+    truncated to 32 bits.
+    """
+    if not gram_sets:
+        return np.empty((0, no_permutations), dtype=np.uint32)
+
+    lengths = np.array([len(grams) for grams in gram_sets], dtype=np.int64)
+    hashes = np.fromiter(
+        (zlib.crc32(g.encode("utf-8")) for grams in gram_sets for g in grams),
+        dtype=np.uint64,
+        count=int(lengths.sum()),
+    )
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]]).astype(np.int64)
+
+    rng = np.random.RandomState(seed)
+    a = rng.randint(1, 1 << 31, size=no_permutations).astype(np.uint64)
+    b = rng.randint(0, 1 << 31, size=no_permutations).astype(np.uint64)
+
+    signatures = np.empty((len(gram_sets), no_permutations), dtype=np.uint32)
+    for k in range(no_permutations):
+        permuted = (a[k] * hashes + b[k]) % np.uint64(PRIME)
+        signatures[:, k] = np.minimum.reduceat(permuted, starts)
+
+    return signatures
+
+
+def band_keys(signatures, bands):
+    """Combines the rows of every band of the signatures into one 64-bit key, as
+    an array of a column per band.
+    """
+    no_rows, band_size = signatures.shape[0], signatures.shape[1] // bands
+    keys = np.zeros((no_rows, bands), dtype=np.uint64)
+
+    for band in range(bands):
+        for column in range(band * band_size, (band + 1) * band_size):
+            keys[:, band] = keys[:, band] * np.uint64(1_000_003) + signatures[:, column]
+
+    return keys
+
+
+def candidate_pairs(signatures, bands, window=20):
+    """Finds the pairs of rows whose signatures are equal in at least one band, as
+    an array of (i, j) rows with i < j.
+
+    In every band, the rows are sorted by their band of the signature and paired
+    with the next window rows having the same one. All pairs of buckets of up to
+    window + 1 rows are thereby found, while the pairs of larger buckets, of very
+    common n-grams, are limited to a sorted neighbourhood.
+    """
+    no_rows = signatures.shape[0]
+    all_keys = band_keys(signatures, bands)
+    codes = []
+
+    for band in range(bands):
+        order = np.argsort(all_keys[:, band], kind="stable")
+        sorted_keys = all_keys[order, band]
+
+        for offset in range(1, window + 1):
+            same = np.flatnonzero(sorted_keys[offset:] == sorted_keys[:-offset])
+            if not len(same):
+                break
+
+            i, j = order[same], order[same + offset]
+            codes += [np.minimum(i, j) * no_rows + np.maximum(i, j)]
+
+    codes = np.unique(np.concatenate(codes)) if codes else np.empty(0, np.int64)
+
+    return np.stack([codes // no_rows, codes % no_rows], axis=1)
+
+
+def estimate_similarities(signatures, pairs, chunk_size=100_000):
+    """Estimates the Jaccard similarities of pairs as the share of equal MinHash
+    values of their signatures.
+    """
+    similarities = np.empty(len(pairs), dtype=np.float32)
+
+    for start in range(0, len(pairs), chunk_size):
+        i, j = pairs[start : start + chunk_size].T
+        equal = signatures[i] == signatures[j]
+        similarities[start : start + chunk_size] = equal.mean(axis=1)
+
+    return similarities
+
+
+def similar_pairs(gram_sets, signatures, pairs, threshold):
+    """Returns the candidate pairs whose n-grams have a Jaccard similarity of at
+    least threshold, only comparing exactly those whose estimate is close to it.
+    """
+    similarities = estimate_similarities(signatures, pairs)
+    close = pairs[similarities >= threshold - ESTIMATE_MARGIN]
+
+    return [
+        (i, j)
+        for i, j in close.tolist()
+        if jaccard(gram_sets[i], gram_sets[j]) >= threshold
+    ]
+
+
+class UnionFind:
+    def __init__(self, size):
+        self.parents = list(range(size))
+
+    def find(self, i):
+        root = i
+        while self.parents[root] != root:
+            root = self.parents[root]
+
+        while self.parents[i] != root:
+            self.parents[i], i = root, self.parents[i]
+
+        return root
+
+    def union(self, i, j):
+        self.parents[self.find(j)] = self.find(i)
+
+
+def find_duplicates(words, threshold=0.8, bands=12, rows=4):
+    """Clusters spelling variants of words, returning the cluster of every word as
+    the position of a representative word, and statistics of the run.
+
+    Words with equal normalised keys are clustered directly. The distinct keys are
+    blocked with MinHash/LSH over their character trigrams, and only candidate
+    pairs sharing a bucket in some band are compared, being clustered if the
+    Jaccard similarity of their trigrams is at least threshold.
+    """
+    start = time.perf_counter()
+
+    key_ids = {}
+    word_keys = [key_ids.setdefault(normalise(word), len(key_ids)) for word in words]
+    keys = list(key_ids)
+
+    if not keys:
+        stats = {
+            "words": 0,
+            "distinct_keys": 0,
+            "candidate_pairs": 0,
+            "similar_pairs": 0,
+            "clusters": 0,
+            "seconds": time.perf_counter() - start,
+        }
+        return [], stats
+
+    gram_sets = [ngrams(key) for key in keys]
+    signatures = minhash_signatures(gram_sets, bands * rows)
+    pairs = candidate_pairs(signatures, bands)
+
+    similar = similar_pairs(gram_sets, signatures, pairs, threshold)
+
+    clusters = UnionFind(len(keys))
+    for i, j in similar:
+        clusters.union(i, j)
+
+    # Represent every cluster of keys by the first word having one of the keys
+    representatives = {}
+    targets = []
+    for i, key in enumerate(word_keys):
+        targets += [representatives.setdefault(clusters.find(key), i)]
+
+    stats = {
+        "words": len(words),
+        "distinct_keys": len(keys),
+        "candidate_pairs": len(pairs),
+        "similar_pairs": len(similar),
+        "clusters": len(representatives),
+        "seconds": time.perf_counter() - start,
+    }
+
+    return targets, stats
+
+
+def merge_clusters(df, targets):
+    """Merges the rows of a DataFrame of words and article_ids lists that are in
+    the same cluster, given as the position of a representative row of each row.
+
+    Every cluster is represented by its most common word, which gets the article
+    ids of all of them.
+    """
+    article_ids = [list(ids) for ids in df["article_ids"]]
+
+    members = {}
+    for i, target in enumerate(targets):
+        members.setdefault(target, []).append(i)
+
+    keep = [False] * len(df)
+    for cluster in members.values():
+        canonical = max(cluster, key=lambda i: len(article_ids[i]))
+        for i in cluster:
+            if i != canonical:
+                article_ids[canonical] += article_ids[i]
+        keep[canonical] = True
+
+    merged = df.copy()
+    merged["article_ids"] = article_ids
+
+    return merged.loc[keep]
+
+
+def deduplicate_entities(df, threshold=0.8):
+    """Merges spelling variants of entities, e.g. "S:t Göran" and "Sankt Göran".
+
+    Takes a DataFrame of words and the article_ids lists of their occurrences, like
+    the output of merging.merge_entities, see merge_clusters.
+    """
+    targets, stats = find_duplicates(df["word"].tolist(), threshold)
+
+    print(
+        f"Deduplication: {stats['words']} words, {stats['candidate_pairs']} "
+        f"candidate pairs, {stats['words'] - stats['clusters']} variants merged "
+        f"in {stats['seconds']:.1f} s"
+    )
+
+    return merge_clusters(df, targets), stats
@@ -0,0 +1,312 @@
+import os
+import sqlite3
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from ..utils.sqlite import select_in
+from .deduplication import (
+    UnionFind,
+    band_keys,
+    candidate_pairs,
+    merge_clusters,
+    minhash_signatures,
+    ngrams,
+    normalise,
+    similar_pairs,
+)
+from .lemma_store import LemmaStore
+from .merging import merge_targets
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS variants (
+    id INTEGER PRIMARY KEY,
+    word TEXT UNIQUE,
+    letter TEXT,
+    lemma TEXT,
+    canonical TEXT
+);
+CREATE INDEX IF NOT EXISTS variants_lemma ON variants (letter, lemma);
+CREATE TABLE IF NOT EXISTS batches (id INTEGER PRIMARY KEY, name TEXT UNIQUE);
+CREATE TABLE IF NOT EXISTS postings (variant_id INTEGER, article_id, batch_id INTEGER);
+CREATE INDEX IF NOT EXISTS postings_batch ON postings (batch_id);
+CREATE INDEX IF NOT EXISTS postings_variant ON postings (variant_id);
+CREATE TABLE IF NOT EXISTS keys (id INTEGER PRIMARY KEY, key TEXT UNIQUE, signature);
+CREATE TABLE IF NOT EXISTS buckets (band INTEGER, hash INTEGER, key_id INTEGER);
+CREATE INDEX IF NOT EXISTS buckets_hash ON buckets (band, hash);
+CREATE TABLE IF NOT EXISTS similar_keys (key_id INTEGER, other_id INTEGER);
+"""
+
+
+class EntityTable:
+    """Persistent table of merged entities, updated incrementally with new batches
+    of NER output instead of re-merging the whole vocabulary.
+
+    Every surface form (variant) of an entity is stored once with its lemma key and
+    the canonical form it is merged into, and every occurrence as a posting of its
+    article id. Variants are merged like in merging.merge_entities: among the words
+    starting with the same character and having the same lemma, the first one of at
+    least three characters in alphabetical order is the canonical form of all later
+    ones. Only variants that still have postings are taken into account.
+
+    Spelling variants are found like in deduplication.find_duplicates: the
+    normalised key of every new variant is put in the MinHash/LSH buckets of the
+    earlier ones and compared to the keys sharing a bucket with it, and the pairs of
+    similar keys are stored. Canonical forms with similar keys are merged when the
+    table is exported.
+    """
+
+    def __init__(
+        self,
+        path="data/entities.sqlite",
+        lemma_store=None,
+        threshold=0.8,
+        bands=12,
+        rows=4,
+    ):
+        # A LemmaStore created here is closed with the table
+        self.owns_lemma_store = lemma_store is None
+        self.lemma_store = lemma_store or LemmaStore()
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = rows
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return len(self._canonical_forms())
+
+    def _canonical_forms(self):
+        rows = self.connection.execute(
+            "SELECT DISTINCT v.canonical FROM postings p "
+            "JOIN variants v ON v.id = p.variant_id"
+        )
+        return [canonical for (canonical,) in rows]
+
+    def _add_variants(self, words):
+        lemmas = self.lemma_store.lemmatize_many(words)
+        self.connection.executemany(
+            "INSERT INTO variants (word, letter, lemma, canonical) VALUES (?, ?, ?, ?)",
+            [(word, word[0], lemma, word) for word, lemma in zip(words, lemmas)],
+        )
+
+    def _add_keys(self, keys):
+        """Stores new normalised keys with their MinHash signatures and LSH buckets,
+        and the pairs of them and other keys that are similar, returning the number
+        of such pairs.
+
+        The new keys are blocked together with the earlier keys sharing a bucket
+        with any of them, like all keys are in find_duplicates.
+        """
+        query = "SELECT key, id FROM keys WHERE key IN"
+        known = dict(select_in(self.connection, query, keys))
+        new_keys = [key for key in dict.fromkeys(keys) if key not in known]
+        if not new_keys:
+            return 0
+
+        new_grams = [ngrams(key) for key in new_keys]
+        new_signatures = minhash_signatures(new_grams, self.bands * self.rows)
+        # SQLite integers are signed
+        hashes = band_keys(new_signatures, self.bands).view(np.int64)
+        buckets = {
+            (band, int(hashes[i, band]))
+            for i in range(len(new_keys))
+            for band in range(self.bands)
+        }
+
+        self.connection.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS new_buckets (band, hash)"
+        )
+        self.connection.execute("DELETE FROM new_buckets")
+        self.connection.executemany("INSERT INTO new_buckets VALUES (?, ?)", buckets)
+        old_ids = [
+            key_id
+            for (key_id,) in self.connection.execute(
+                "SELECT DISTINCT b.key_id FROM new_buckets n "
+                "JOIN buckets b ON b.band = n.band AND b.hash = n.hash"
+            )
+        ]
+        query = "SELECT id, key, signature FROM keys WHERE id IN"
+        old = list(select_in(self.connection, query, old_ids))
+
+        self.connection.executemany(
+            "INSERT INTO keys (key, signature) VALUES (?, ?)",
+            [(key, sig.tobytes()) for key, sig in zip(new_keys, new_signatures)],
+        )
+        query = "SELECT key, id FROM keys WHERE key IN"
+        ids = dict(select_in(self.connection, query, new_keys))
+        self.connection.executemany(
+            "INSERT INTO buckets VALUES (?, ?, ?)",
+            [
+                (band, int(hashes[i, band]), ids[key])
+                for i, key in enumerate(new_keys)
+                for band in range(self.bands)
+            ],
+        )
+
+        key_ids = [key_id for key_id, _, _ in old] + [ids[key] for key in new_keys]
+        gram_sets = [ngrams(key) for _, key, _ in old] + new_grams
+        old_signatures = [np.frombuffer(sig, dtype=np.uint32) for _, _, sig in old]
+        signatures = np.vstack(old_signatures + [new_signatures])
+
+        # Pairs of two earlier keys were stored when the later of them was added
+        pairs = candidate_pairs(signatures, self.bands)
+        pairs = pairs[pairs[:, 1] >= len(old)]
+        similar = [
+            (key_ids[i], key_ids[j])
+            for i, j in similar_pairs(gram_sets, signatures, pairs, self.threshold)
+        ]
+        self.connection.executemany("INSERT INTO similar_keys VALUES (?, ?)", similar)
+
+        return len(similar)
+
+    def _remerge(self, lemma_keys):
+        """Recomputes the canonical forms of the variants with the given lemma keys,
+        among the variants that have postings.
+        """
+        updates = []
+        for letter, lemma in lemma_keys:
+            rows = self.connection.execute(
+                "SELECT word, canonical FROM variants v "
+                "WHERE letter = ? AND lemma = ? "
+                "AND EXISTS (SELECT 1 FROM postings p WHERE p.variant_id = v.id)",
+                (letter, lemma),
+            )
+            rows = sorted(rows)
+            words = [word for word, _ in rows]
+            targets = merge_targets(words, [lemma] * len(words))
+
+            for (word, canonical), target in zip(rows, targets):
+                if words[target] != canonical:
+                    updates += [(words[target], word)]
+
+        self.connection.executemany(
+            "UPDATE variants SET canonical = ? WHERE word = ?", updates
+        )
+
+        return len(updates)
+
+    def add(self, entities, batch):
+        """Merges a batch of entities, a DataFrame with a row of word and article_id
+        per occurrence, into the table.
+
+        Only the words not seen in earlier batches are lemmatized and compared to
+        earlier words, and only the canonical forms of words with the same lemma
+        keys as them are recomputed. Adding a batch with the name of an earlier one
+        replaces its postings, recomputing the canonical forms of its words.
+        """
+        words = entities["word"].tolist()
+        article_ids = entities["article_id"].tolist()
+
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR IGNORE INTO batches (name) VALUES (?)", (batch,)
+            )
+            (batch_id,) = self.connection.execute(
+                "SELECT id FROM batches WHERE name = ?", (batch,)
+            ).fetchone()
+
+            # The words of a replaced batch may no longer occur
+            lemma_keys = set(
+                self.connection.execute(
+                    "SELECT DISTINCT v.letter, v.lemma FROM postings p "
+                    "JOIN variants v ON v.id = p.variant_id WHERE p.batch_id = ?",
+                    (batch_id,),
+                )
+            )
+            self.connection.execute(
+                "DELETE FROM postings WHERE batch_id = ?", (batch_id,)
+            )
+
+            distinct = list(dict.fromkeys(words))
+            query = "SELECT word, id FROM variants WHERE word IN"
+            ids = dict(select_in(self.connection, query, distinct))
+            new_words = [word for word in distinct if word not in ids]
+            no_similar = 0
+            if new_words:
+                self._add_variants(new_words)
+                no_similar = self._add_keys([normalise(word) for word in new_words])
+                ids.update(select_in(self.connection, query, new_words))
+
+            self.connection.executemany(
+                "INSERT INTO postings VALUES (?, ?, ?)",
+                ((ids[w], aid, batch_id) for w, aid in zip(words, article_ids)),
+            )
+
+            query = "SELECT letter, lemma FROM variants WHERE word IN"
+            lemma_keys.update(select_in(self.connection, query, new_words))
+            no_changed = self._remerge(lemma_keys)
+
+        print(
+            f"Entity table: {len(words)} occurrences of {len(distinct)} words added, "
+            f"{len(new_words)} of them new, {no_changed} canonical forms changed, "
+            f"{no_similar} similar spellings found"
+        )
+
+    def _duplicates(self, words):
+        """Returns the position of a representative word of every word, the first
+        one with a key similar to its own, directly or through other words.
+        """
+        key_positions = defaultdict(list)
+        for i, word in enumerate(words):
+            key_positions[normalise(word)].append(i)
+
+        clusters = UnionFind(len(words))
+        for positions in key_positions.values():
+            for i in positions[1:]:
+                clusters.union(positions[0], i)
+
+        rows = self.connection.execute(
+            "SELECT k.key, o.key FROM similar_keys s "
+            "JOIN keys k ON k.id = s.key_id JOIN keys o ON o.id = s.other_id"
+        )
+        for key, other in rows:
+            if key in key_positions and other in key_positions:
+                clusters.union(key_positions[key][0], key_positions[other][0])
+
+        representatives = {}
+        return [
+            representatives.setdefault(clusters.find(i), i) for i in range(len(words))
+        ]
+
+    def to_df(self, deduplicate=True):
+        """Returns the canonical forms and the article_ids lists of the occurrences
+        of all their variants, sorted by the number of occurrences.
+
+        Unless deduplicate is False, canonical forms that are spelling variants of
+        each other are merged too. Since the keys they are compared on are
+        lowercased, this also merges words differing only in case, e.g.
+        "Stockholm" and "stockholm".
+        """
+        rows = self.connection.execute(
+            "SELECT v.canonical, p.article_id FROM postings p "
+            "JOIN variants v ON v.id = p.variant_id "
+            "ORDER BY v.canonical, v.word, p.rowid"
+        )
+
+        article_ids = defaultdict(list)
+        for canonical, article_id in rows:
+            article_ids[canonical] += [article_id]
+
+        words = list(article_ids)
+        df = pd.DataFrame({"word": words, "article_ids": list(article_ids.values())})
+        if deduplicate:
+            df = merge_clusters(df, self._duplicates(words))
+        df["no_occurrences"] = df["article_ids"].str.len()
+
+        return df.sort_values(by=["no_occurrences"], ascending=False)
+
+    def close(self):
+        self.connection.close()
+        if self.owns_lemma_store:
+            self.lemma_store.close()
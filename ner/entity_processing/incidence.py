@@ -0,0 +1,66 @@
+from itertools import chain
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+
+def article_codes(*columns):
+    """Maps every article id in the article_ids lists of the given columns to an
+    integer code, in order of first occurrence.
+    """
+    codes = {}
+    for column in columns:
+        for article_ids in column:
+            for article_id in article_ids:
+                codes.setdefault(article_id, len(codes))
+
+    return codes
+
+
+def incidence_matrix(article_ids, codes, column_codes=None):
+    """Returns a sparse matrix of how many times every article occurs in each list
+    of article_ids, with a row per article code and a column per list.
+
+    If column_codes are given, the lists are instead counted in the columns of
+    their codes, e.g. those of pd.factorize, summing lists with the same code.
+    """
+    lengths = np.fromiter(map(len, article_ids), dtype=np.int64, count=len(article_ids))
+    if column_codes is None:
+        column_codes = np.arange(len(article_ids))
+    no_columns = int(np.max(column_codes, initial=-1)) + 1
+
+    rows = np.fromiter(
+        map(codes.__getitem__, chain.from_iterable(article_ids)),
+        dtype=np.int64,
+        count=int(lengths.sum()),
+    )
+    columns = np.repeat(column_codes, lengths)
+    counts = np.ones(len(rows), dtype=np.int64)
+
+    # Duplicate (row, column) entries are summed when converting to CSR
+    shape = (len(codes), no_columns)
+    return sparse.coo_matrix((counts, (rows, columns)), shape=shape).tocsr()
+
+
+def category_entity_counts(categories, entities):
+    """Counts the occurrences of every entity in the articles of every category.
+
+    Takes DataFrames of categories and entities with the article_ids lists of the
+    articles using them, and builds integer-coded article × category and article ×
+    entity matrices, whose product is the category × entity counts. Entities with
+    the same word are counted together. Returns the counts as a CSR matrix and the
+    word of each of its columns.
+    """
+    codes = article_codes(categories["article_ids"], entities["article_ids"])
+    word_codes, words = pd.factorize(entities["word"])
+
+    article_categories = incidence_matrix(categories["article_ids"].tolist(), codes)
+    article_entities = incidence_matrix(
+        entities["article_ids"].tolist(), codes, word_codes
+    )
+
+    counts = (article_categories.T @ article_entities).tocsr()
+    counts.eliminate_zeros()
+
+    return counts, np.asarray(words, dtype=object)
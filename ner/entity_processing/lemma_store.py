@@ -0,0 +1,105 @@
+import os
+import sqlite3
+from collections import OrderedDict
+
+import lemmy
+import pandas as pd
+
+from ..utils.sqlite import select_in
+
+
+class LemmaStore:
+    """Persistent store of the lowercased proper noun lemmas of words.
+
+    Lemmas are stored in a SQLite file, with the max_memory_entries most recently
+    used ones also kept in memory. lemmy is only loaded, and only lemmatizes, the
+    words found in neither.
+    """
+
+    def __init__(self, path="data/lemmas.sqlite", max_memory_entries=1_000_000):
+        self.max_memory_entries = max_memory_entries
+        self.memory = OrderedDict()
+        self.lemmatizer = None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS lemmas (word TEXT PRIMARY KEY, lemma TEXT)"
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __call__(self, word):
+        return self.lemmatize_many([word])[0]
+
+    def _load_from_disk(self, words):
+        query = "SELECT word, lemma FROM lemmas WHERE word IN"
+
+        return dict(select_in(self.connection, query, words))
+
+    def _lemmatize(self, words):
+        if self.lemmatizer is None:
+            self.lemmatizer = lemmy.load("sv")
+
+        lemmas = {w: self.lemmatizer.lemmatize("PROPN", w)[0].lower() for w in words}
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO lemmas VALUES (?, ?)", lemmas.items()
+        )
+        self.connection.commit()
+
+        return lemmas
+
+    def _remember(self, lemmas):
+        for word, lemma in lemmas.items():
+            self.memory[word] = lemma
+            self.memory.move_to_end(word)
+
+        while len(self.memory) > self.max_memory_entries:
+            self.memory.popitem(last=False)
+
+    def lemmatize_many(self, words):
+        """Returns the lemma of each word, looking up every distinct word once."""
+        lemmas = {}
+        to_load = []
+
+        for word in dict.fromkeys(words):
+            if word in self.memory:
+                self.memory.move_to_end(word)
+                lemmas[word] = self.memory[word]
+            else:
+                to_load += [word]
+
+        self.memory_hits += len(lemmas)
+        found = self._load_from_disk(to_load)
+        self.disk_hits += len(found)
+
+        missing = [word for word in to_load if word not in found]
+        self.misses += len(missing)
+        if missing:
+            found.update(self._lemmatize(missing))
+
+        self._remember(found)
+        lemmas.update(found)
+
+        return [lemmas[word] for word in words]
+
+    def lemmatize_column(self, column):
+        """Returns the lemmas of a column of words as a Series with the same index."""
+        return pd.Series(self.lemmatize_many(column.tolist()), index=column.index)
+
+    def close(self):
+        self.connection.close()
+
+    def print_stats(self):
+        print(
+            f"Lemma store: {self.memory_hits} memory hits, {self.disk_hits} disk "
+            f"hits, {self.misses} words lemmatized"
+        )
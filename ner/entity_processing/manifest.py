@@ -0,0 +1,92 @@
+import hashlib
+import json
+import os
+
+from ..utils.jsonl import iter_jsonl, loads, write_jsonl
+
+
+def content_hash(article):
+    serialized = json.dumps(article, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(serialized.encode("utf-8")).hexdigest()
+
+
+class Manifest:
+    """Append-only record of the articles written to a set of output files.
+
+    The ids and content hashes of processed articles are kept pending until a
+    checkpoint, when they are written together with the sizes of the (flushed)
+    output files. Output written after the last checkpoint can thereby be cut off
+    when resuming, so that no article is written twice.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.hashes = {}
+        self.offsets = None
+        self.pending = []
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+
+        for obj in iter_jsonl(self.path):
+            if "offsets" in obj:
+                self.offsets = obj["offsets"]
+            else:
+                self.hashes[obj["id"]] = obj["hash"]
+
+    def reset(self):
+        open(self.path, "w").close()
+
+    def restore(self, paths):
+        """Truncates the output files to their sizes at the last checkpoint."""
+        if self.offsets is None:
+            return
+
+        for path, offset in zip(paths, self.offsets):
+            if os.path.exists(path) and os.path.getsize(path) > offset:
+                os.truncate(path, offset)
+
+    def is_processed(self, article, check_hash=True):
+        """Whether an article has been processed, and unchanged if check_hash is set."""
+        processed = self.hashes.get(article["id"])
+
+        if not check_hash:
+            return processed is not None
+
+        return processed == content_hash(article)
+
+    def add(self, article):
+        self.pending += [(article["id"], content_hash(article))]
+
+    def checkpoint(self, paths):
+        """Records the pending articles, which must already be flushed to the output
+        files, together with the current sizes of the output files.
+        """
+        self.offsets = [os.path.getsize(path) for path in paths]
+
+        records = [
+            {"id": aid, "hash": article_hash} for aid, article_hash in self.pending
+        ]
+        write_jsonl(records + [{"offsets": self.offsets}], self.path, mode="a")
+        self.hashes.update(self.pending)
+
+        self.pending = []
+
+
+def remove_superseded(path, ids, offset, get_id):
+    """Removes the records before offset in a JSONL file whose ids are in ids, i.e.
+    records that have been superseded by records appended to the file later on.
+    """
+    temp_path = path + ".tmp"
+
+    with open(path, "rb") as f, open(temp_path, "wb") as temp:
+        position = 0
+        for line in f:
+            superseded = position < offset and get_id(loads(line)) in ids
+            position += len(line)
+
+            if not superseded:
+                temp.write(line)
+
+    os.replace(temp_path, path)
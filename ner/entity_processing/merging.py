@@ -0,0 +1,56 @@
+from .lemma_store import LemmaStore
+
+
+def merge_targets(words, lemmas):
+    """Returns, for every word of an alphabetically sorted list, the position of the
+    word it is merged into, or its own position if it is kept.
+
+    Within every run of consecutive words starting with the same (lowercased)
+    letter, the first word of at least three characters with a given lemma absorbs
+    all later words with that lemma. Shorter words preceding it are kept as is.
+    """
+    targets = list(range(len(words)))
+    absorbers, previous_letter = {}, None
+
+    for i, (word, lemma) in enumerate(zip(words, lemmas)):
+        letter = word.lower()[0]
+        if letter != previous_letter:
+            absorbers, previous_letter = {}, letter
+
+        if lemma in absorbers:
+            targets[i] = absorbers[lemma]
+        elif len(word) >= 3:
+            absorbers[lemma] = i
+
+    return targets
+
+
+def merge_entities(df, lemma_store=None):
+    """Merges similar entities based on their lemmatized form with the purpose
+    to reduce spelling/capitalization/inflection variations.
+
+    Takes a DataFrame of unique, sorted words and the article_ids lists of their
+    occurrences. Every distinct word is lemmatized once, or looked up in the
+    LemmaStore if lemmatized in an earlier run, and words are merged by looking up
+    their lemmas in a hash map of the words absorbing them, in a single pass
+    instead of comparing every pair of words. A LemmaStore created here is closed
+    again when done.
+    """
+    words = df["word"].tolist()
+    if lemma_store:
+        lemmas = lemma_store.lemmatize_many(words)
+    else:
+        with LemmaStore() as store:
+            lemmas = store.lemmatize_many(words)
+
+    targets = merge_targets(words, lemmas)
+    article_ids = [list(ids) for ids in df["article_ids"]]
+
+    for i, target in enumerate(targets):
+        if target != i:
+            article_ids[target] += article_ids[i]
+
+    merged = df.copy()
+    merged["article_ids"] = article_ids
+
+    return merged.loc[[target == i for i, target in enumerate(targets)]]
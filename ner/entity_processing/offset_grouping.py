@@ -0,0 +1,100 @@
+import numpy as np
+
+
+class OffsetGrouper:
+    """Alternative to group_entities that groups the token predictions of a sentence
+    using the character offsets given by a fast tokenizer.
+
+    Runs of tokens are merged by the same rules as in group_entities, but working on
+    arrays of label ids, scores and offsets rather than on token strings. The surface
+    form of an entity is sliced straight from the sentence, which means that spacing
+    no longer has to be guessed from punctuation and that [UNK] tokens keep the
+    characters they stand for.
+    """
+
+    def __init__(self, nlp, fast_tokenizer, punct):
+        self.tokenizer = fast_tokenizer
+        self.punct = punct
+
+        id2label = nlp.model.config.id2label
+        self.labels = [id2label[i] for i in range(len(id2label))]
+        self.ignore_ids = [
+            i for i, label in enumerate(self.labels) if label in nlp.ignore_labels
+        ]
+        self.per_or_loc_ids = [
+            i for i, label in enumerate(self.labels) if label in ("PER", "LOC")
+        ]
+
+        vocab = fast_tokenizer.get_vocab()
+        self.is_subword = np.zeros(len(vocab), dtype=bool)
+        for token, i in vocab.items():
+            self.is_subword[i] = token.startswith("##")
+
+    def encode(self, sentence):
+        """Returns the token ids and the character offsets of each token."""
+        encoded = self.tokenizer.encode_plus(
+            sentence, return_attention_mask=False, return_offsets_mapping=True
+        )
+
+        return encoded["input_ids"], encoded["offset_mapping"]
+
+    def group(self, sentence, input_ids, offsets, logits):
+        """Groups the tokens of a sentence into entities with averaged scores."""
+        scores = np.exp(logits) / np.exp(logits).sum(-1, keepdims=True)
+        label_ids = scores.argmax(axis=-1)
+        scores = scores[np.arange(len(label_ids)), label_ids]
+
+        offsets = np.asarray(offsets)
+        # Special tokens are the only ones without any characters
+        keep = ~np.isin(label_ids, self.ignore_ids) & (offsets[:, 1] > offsets[:, 0])
+        positions = np.flatnonzero(keep)
+        is_subword = self.is_subword[np.asarray(input_ids)[positions]]
+
+        # Every group is a list of [start, end, label id, score sum, count, position]
+        groups = []
+
+        for i, subword in zip(positions.tolist(), is_subword.tolist()):
+            start, end = offsets[i].tolist()
+            label, score = int(label_ids[i]), float(scores[i])
+
+            if groups:
+                previous = groups[-1]
+                adjacent = previous[5] == i - 1
+                same_entity = previous[2] == label
+
+            if groups and subword:
+                # Subwords that do not have a starting part are ignored
+                if not adjacent:
+                    continue
+
+                # Select the type with the highest score for words of mixed types
+                if not same_entity and previous[3] / previous[4] < score:
+                    previous[2] = label
+
+            elif groups and adjacent and same_entity:
+                word = sentence[start:end]
+                # Ignore persons and locations that have "," or "och" in their names
+                if label in self.per_or_loc_ids and word in (",", "och"):
+                    continue
+
+            else:
+                word = sentence[start:end]
+                if subword or word in self.punct or word == "s":
+                    continue
+
+                groups += [[start, end, label, score, 1, i]]
+                continue
+
+            previous[1] = end
+            previous[3] += score
+            previous[4] += 1
+            previous[5] = i
+
+        return [
+            {
+                "word": sentence[start:end],
+                "score": score_sum / count,
+                "entity": self.labels[label],
+            }
+            for start, end, label, score_sum, count, _ in groups
+        ]
@@ -0,0 +1,119 @@
+import hashlib
+import os
+
+import numpy as np
+import onnxruntime
+import torch
+from onnxruntime.quantization import QuantType, quantize_dynamic
+
+from .batching import decode_entities, forward_all
+
+
+class OnnxBackend:
+    """Runs the forward pass of the NER model through ONNX Runtime on CPU.
+
+    The PyTorch model is exported to an ONNX graph once, optionally quantized
+    dynamically to int8, and cached in a directory of the model under model_dir
+    together with the graph optimized by ONNX Runtime. Instances are called with
+    input ids and an attention mask, like the backends expected by batching.forward.
+    """
+
+    def __init__(self, nlp, model_dir="data/models/onnx", quantize=False, threads=0):
+        model_dir = os.path.join(model_dir, self.model_key(nlp.model))
+        os.makedirs(model_dir, exist_ok=True)
+        self.path = self.export(nlp.model, model_dir, quantize)
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = (
+            onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        )
+        options.optimized_model_filepath = self.path.replace(".onnx", "_opt.onnx")
+        options.intra_op_num_threads = threads
+
+        self.session = onnxruntime.InferenceSession(self.path, options)
+
+    @staticmethod
+    def model_key(model):
+        """Returns the name of the directory of a model's exported graphs, made up
+        of its name and a hash of its config, so that graphs of other models (or
+        of models with the same name but another config) are never reused.
+        """
+        config = model.config
+        name = getattr(config, "_name_or_path", "") or type(model).__name__
+        name = "".join(c if c.isalnum() or c in "-_." else "_" for c in name)
+        digest = hashlib.sha256(config.to_json_string().encode("utf-8"))
+
+        return f"{name.strip('_')}-{digest.hexdigest()[:12]}"
+
+    @staticmethod
+    def export(model, model_dir, quantize):
+        """Exports the model to ONNX, unless an exported graph already exists, and
+        returns the path of the graph.
+        """
+        path = os.path.join(model_dir, "ner.onnx")
+        quantized_path = os.path.join(model_dir, "ner_int8.onnx")
+
+        if not os.path.exists(path):
+            model.eval()
+            dummy = torch.ones((1, 8), dtype=torch.long)
+            axes = {0: "batch", 1: "sequence"}
+
+            torch.onnx.export(
+                model,
+                (dummy, dummy, torch.zeros_like(dummy)),
+                path,
+                input_names=["input_ids", "attention_mask", "token_type_ids"],
+                output_names=["logits"],
+                dynamic_axes={
+                    "input_ids": axes,
+                    "attention_mask": axes,
+                    "token_type_ids": axes,
+                    "logits": axes,
+                },
+                opset_version=11,
+            )
+
+        if quantize and not os.path.exists(quantized_path):
+            quantize_dynamic(path, quantized_path, weight_type=QuantType.QInt8)
+
+        return quantized_path if quantize else path
+
+    def __call__(self, input_ids, attention_mask):
+        inputs = {
+            "input_ids": input_ids,
+            "attention_mask": attention_mask,
+            "token_type_ids": np.zeros_like(input_ids),
+        }
+
+        return self.session.run(["logits"], inputs)[0]
+
+
+def compare_backends(nlp, backend, sequences, batch_size=32):
+    """Reports how far the predictions of a backend diverge from those of PyTorch
+    on a sample of encoded sentences.
+    """
+    reference = forward_all(nlp, sequences, batch_size)
+    candidate = forward_all(nlp, sequences, batch_size, backend=backend)
+
+    max_diff, no_tokens, no_same_labels, no_same_sentences = 0.0, 0, 0, 0
+
+    for ids, ref, cand in zip(sequences, reference, candidate):
+        max_diff = max(max_diff, float(np.abs(ref - cand).max()))
+        same_labels = ref.argmax(-1) == cand.argmax(-1)
+        no_tokens += len(same_labels)
+        no_same_labels += int(same_labels.sum())
+
+        ref_entities = decode_entities(nlp, ids, ref)
+        cand_entities = decode_entities(nlp, ids, cand)
+        no_same_sentences += [(e["word"], e["entity"]) for e in ref_entities] == [
+            (e["word"], e["entity"]) for e in cand_entities
+        ]
+
+    print(f"Max absolute logit difference: {max_diff}")
+    print(f"Token label agreement: {no_same_labels / max(no_tokens, 1):.5f}")
+    print(
+        f"Sentences with identical entities: "
+        f"{no_same_sentences / max(len(sequences), 1):.5f}"
+    )
+
+    return max_diff, no_same_labels / max(no_tokens, 1)
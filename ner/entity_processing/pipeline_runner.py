@@ -0,0 +1,323 @@
+import argparse
+import ast
+import hashlib
+import json
+import os
+import runpy
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import get_context
+
+from ..utils.file_handling import dataset_paths
+from .recognition import stream_entities
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STATE_PATH = "data/pipeline_state.json"
+
+
+class Stage:
+    """A step of the pipeline, running target(*args, **kwargs) in a worker process,
+    or the module as a script with args as its command line if no target is given.
+
+    The stage is skipped if its input files, the source of its module (including
+    the modules it imports from the ner package) and its arguments are unchanged
+    since its last successful run, and its outputs still exist. If its code changed
+    since then, or it is forced, it is run with rerun_kwargs updating its kwargs,
+    e.g. to reprocess all inputs instead of only new ones.
+    """
+
+    def __init__(
+        self,
+        name,
+        module,
+        inputs,
+        outputs,
+        target=None,
+        args=(),
+        kwargs=None,
+        rerun_kwargs=None,
+    ):
+        self.name = name
+        self.module = module
+        self.inputs = inputs
+        self.outputs = outputs
+        self.target = target or run_module
+        self.args = args if target else (module, list(args))
+        self.kwargs = kwargs or {}
+        self.rerun_kwargs = rerun_kwargs or {}
+
+
+def run_module(module, argv=()):
+    """Runs a script module like python -m would, without blocking on plots."""
+    os.environ.setdefault("MPLBACKEND", "Agg")
+    sys.argv = [module, *argv]
+    runpy.run_module(module, run_name="__main__", alter_sys=True)
+
+
+# The stage grouping the entities of a dataset by the categories of its articles,
+# which are tags in MittMedia articles and categories in TT articles
+CATEGORY_STAGES = {
+    "10k": ("analysis", "ner.entity_processing.analysis"),
+    "tt_new": ("category_grouping", "ner.entity_processing.category_grouping"),
+}
+
+
+def create_stages(datasets=tuple(CATEGORY_STAGES)):
+    """Returns the stages processing the datasets, named "<dataset>/<stage>": the
+    recognition of new or changed articles, the cleaning of its output and the
+    grouping by categories. The stages of different datasets are independent, so
+    that e.g. the analysis of one dataset and the category grouping of another run
+    in parallel.
+    """
+    stages = []
+    for dataset in datasets:
+        paths = dataset_paths(dataset)
+        dataset_args = ["--dataset", dataset]
+        dataframes = [paths["articles_df"], paths["merged_entities_df"]]
+        category_stage, category_module = CATEGORY_STAGES[dataset]
+        analysis = category_stage == "analysis"
+
+        stages += [
+            # Only new or changed articles are recognized, unless the code changed
+            Stage(
+                f"{dataset}/recognition",
+                "ner.entity_processing.recognition",
+                [paths["articles"]],
+                [paths["results"], paths["omitted"], paths["manifest"]],
+                target=stream_entities,
+                args=(paths["articles"], paths["results"], paths["omitted"]),
+                kwargs={"manifest_path": paths["manifest"], "mode": "incremental"},
+                rerun_kwargs={"mode": "overwrite"},
+            ),
+            Stage(
+                f"{dataset}/cleaning",
+                "ner.entity_processing.cleaning",
+                [paths["results"]],
+                dataframes + [paths["all_entities_df"], paths["entity_table"]],
+                args=dataset_args,
+            ),
+            # Only the analysis reads all entities and writes the categories
+            Stage(
+                f"{dataset}/{category_stage}",
+                category_module,
+                dataframes + ([paths["all_entities_df"]] if analysis else []),
+                [paths["categories_df"]] if analysis else [],
+                args=dataset_args,
+            ),
+        ]
+
+    return stages
+
+
+def module_path(module):
+    parts = module.split(".")[1:]
+    path = os.path.join(PACKAGE_DIR, *parts)
+
+    return path + ".py" if os.path.exists(path + ".py") else path + "/__init__.py"
+
+
+def local_dependencies(path):
+    """Returns the source files of a module and of every module it imports from
+    the ner package, directly or indirectly, by following its relative imports.
+    """
+    found, to_visit = set(), [os.path.abspath(path)]
+
+    while to_visit:
+        path = to_visit.pop()
+        if path in found or not os.path.exists(path):
+            continue
+        found.add(path)
+
+        with open(path) as f:
+            tree = ast.parse(f.read())
+
+        for node in ast.walk(tree):
+            if not isinstance(node, ast.ImportFrom) or not node.level:
+                continue
+
+            base = os.path.dirname(path)
+            for _ in range(node.level - 1):
+                base = os.path.dirname(base)
+
+            if node.module:
+                names = [node.module.replace(".", os.sep)]
+            else:
+                names = [alias.name for alias in node.names]
+
+            for name in names:
+                target = os.path.join(base, name)
+                to_visit += [target + ".py", os.path.join(target, "__init__.py")]
+
+    return sorted(found)
+
+
+class FileHasher:
+    """Hashes files, reusing earlier hashes of files whose size and modification
+    time are unchanged, so that large unchanged inputs are not read again.
+    """
+
+    def __init__(self, known):
+        self.known = known
+
+    def __call__(self, path):
+        if not os.path.exists(path):
+            return None
+
+        stat = os.stat(path)
+        known = self.known.get(path)
+        if known and known["size"] == stat.st_size and known["mtime"] == stat.st_mtime:
+            return known["sha256"]
+
+        sha256 = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                sha256.update(block)
+
+        self.known[path] = {
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "sha256": sha256.hexdigest(),
+        }
+        return self.known[path]["sha256"]
+
+
+def _hash(key):
+    serialized = json.dumps(key, sort_keys=True)
+
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+def code_hash(stage, hash_file):
+    code = local_dependencies(module_path(stage.module))
+
+    return _hash({os.path.relpath(path, PACKAGE_DIR): hash_file(path) for path in code})
+
+
+def stage_hash(stage, hash_file):
+    key = {
+        "inputs": {path: hash_file(path) for path in stage.inputs},
+        "code": code_hash(stage, hash_file),
+        "target": stage.target.__name__,
+        "args": [repr(arg) for arg in stage.args],
+        "kwargs": {key: repr(value) for key, value in stage.kwargs.items()},
+    }
+
+    return _hash(key)
+
+
+def dependencies(stages):
+    """Maps every stage to the stages producing its inputs."""
+    producers = {path: stage.name for stage in stages for path in stage.outputs}
+
+    return {
+        stage.name: {producers[p] for p in stage.inputs if p in producers}
+        for stage in stages
+    }
+
+
+def load_state(path):
+    state = {"stages": {}, "code": {}, "files": {}}
+    if os.path.exists(path):
+        with open(path) as f:
+            state.update(json.load(f))
+
+    return state
+
+
+def save_state(state, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(state, f, indent=2)
+
+
+def run_pipeline(stages=None, force=(), no_workers=None, state_path=STATE_PATH):
+    """Runs the stages whose inputs or code changed since their last run, and the
+    stages depending on them, running independent stages in parallel.
+    """
+    stages = stages or create_stages()
+    state = load_state(state_path)
+    hash_file = FileHasher(state["files"])
+    depends_on = dependencies(stages)
+    by_name = {stage.name: stage for stage in stages}
+
+    pending = set(by_name)
+    done, failed = set(), set()
+    running = {}
+
+    with ProcessPoolExecutor(no_workers, mp_context=get_context("spawn")) as pool:
+        while pending or running:
+            ended = done | failed
+            ready = [name for name in sorted(pending) if depends_on[name] <= ended]
+            if not ready and not running:
+                raise ValueError(f"Cyclic dependencies between {sorted(pending)}")
+
+            for name in ready:
+                stage = by_name[name]
+                pending.remove(name)
+
+                if depends_on[name] & failed:
+                    print(f"{name}: skipped, since a stage it depends on failed")
+                    failed.add(name)
+                    continue
+
+                current_hash = stage_hash(stage, hash_file)
+                outputs_exist = all(os.path.exists(path) for path in stage.outputs)
+                if (
+                    name not in force
+                    and outputs_exist
+                    and state["stages"].get(name) == current_hash
+                ):
+                    print(f"{name}: up to date")
+                    done.add(name)
+                    continue
+
+                current_code = code_hash(stage, hash_file)
+                kwargs = stage.kwargs
+                if name in force or state["code"].get(name) != current_code:
+                    kwargs = {**kwargs, **stage.rerun_kwargs}
+
+                print(f"{name}: running…")
+                future = pool.submit(stage.target, *stage.args, **kwargs)
+                hashes = (current_hash, current_code)
+                running[future] = (name, hashes, time.perf_counter())
+
+            if not running:
+                continue
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name, (current_hash, current_code), start = running.pop(future)
+                elapsed = time.perf_counter() - start
+
+                if future.exception():
+                    print(f"{name}: failed after {elapsed:.1f} s: {future.exception()}")
+                    failed.add(name)
+                else:
+                    print(f"{name}: done in {elapsed:.1f} s")
+                    state["stages"][name] = current_hash
+                    state["code"][name] = current_code
+                    done.add(name)
+
+                save_state(state, state_path)
+
+    save_state(state, state_path)
+    if failed:
+        raise RuntimeError(f"Failed stages: {', '.join(sorted(failed))}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Runs the NER stages whose inputs or code changed"
+    )
+    parser.add_argument(
+        "--datasets", nargs="+", choices=CATEGORY_STAGES, default=list(CATEGORY_STAGES)
+    )
+    parser.add_argument(
+        "--force", nargs="+", default=[], help="stages to re-run, e.g. 10k/cleaning"
+    )
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    stages = create_stages(args.datasets)
+    run_pipeline(stages, force=args.force, no_workers=args.workers)
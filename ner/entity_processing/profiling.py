@@ -0,0 +1,108 @@
+import json
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager, nullcontext
+
+# Upper bounds, in characters, of the sentence length buckets of the histogram
+LENGTH_BUCKETS = [25, 50, 100, 200, 400, 800, float("inf")]
+
+
+class Profiler:
+    """Opt-in instrumentation of recognize_entities.
+
+    Records the wall time and number of calls per stage, a histogram of sentence
+    lengths against model latency and the reasons for omitting articles. A JSON
+    summary is written to path at the end of a run and, during long runs, every
+    snapshot_every seconds. Stages may be recorded from several threads, as in
+    pipelined runs, in which case their times overlap.
+    """
+
+    def __init__(self, path, snapshot_every=300):
+        self.path = path
+        self.snapshot_every = snapshot_every
+
+        self.start_time = time.perf_counter()
+        self.last_snapshot = self.start_time
+        self.times = defaultdict(float)
+        self.calls = Counter()
+        self.no_sentences = Counter()
+        self.latencies = defaultdict(float)
+        self.omitted = Counter()
+        self.no_articles = 0
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.times[name] += time.perf_counter() - start
+                self.calls[name] += 1
+
+    def record_sentences(self, lengths, elapsed):
+        """Records the lengths of sentences run through the model together and their
+        latency, shared between the sentences in proportion to their lengths.
+        """
+        total = max(sum(lengths), 1)
+        with self.lock:
+            for length in lengths:
+                bucket = next(b for b in LENGTH_BUCKETS if length <= b)
+                self.no_sentences[bucket] += 1
+                self.latencies[bucket] += elapsed * length / total
+
+    def record_article(self, omit_reason=None):
+        self.no_articles += 1
+        if omit_reason:
+            self.omitted[omit_reason] += 1
+
+        if time.perf_counter() - self.last_snapshot > self.snapshot_every:
+            self.write()
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.start_time
+
+        return {
+            "elapsed_seconds": elapsed,
+            "articles": self.no_articles,
+            "stages": {
+                name: {"seconds": self.times[name], "calls": self.calls[name]}
+                for name in self.times
+            },
+            "sentence_lengths": [
+                {
+                    "max_characters": bucket if bucket != float("inf") else None,
+                    "sentences": self.no_sentences[bucket],
+                    "mean_latency_ms": 1000
+                    * self.latencies[bucket]
+                    / max(self.no_sentences[bucket], 1),
+                }
+                for bucket in LENGTH_BUCKETS
+            ],
+            "omitted": dict(self.omitted),
+        }
+
+    def write(self):
+        self.last_snapshot = time.perf_counter()
+        with open(self.path, "w") as f:
+            json.dump(self.summary(), f, indent=2)
+
+
+class NullProfiler:
+    """Stand-in used when profiling is disabled, doing as little as possible."""
+
+    _context = nullcontext()
+
+    def stage(self, name):
+        return self._context
+
+    def record_sentences(self, lengths, elapsed):
+        pass
+
+    def record_article(self, omit_reason=None):
+        pass
+
+    def write(self):
+        pass
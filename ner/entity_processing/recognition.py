@@ -1,12 +1,43 @@
+import os
 import re
 import random
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
 from string import punctuation
 
-import jsonlines
+import torch
 from tqdm import tqdm
-from transformers import pipeline
-
-from ..utils.file_handling import write_output_to_file
+from transformers import BertTokenizerFast, pipeline
+
+from ..utils.file_handling import EntityTableWriter, write_output_to_file
+from ..utils.jsonl import JsonlWriter, iter_jsonl, open_jsonl, read_jsonl
+from .batching import (
+    BatchStats,
+    decode_entities,
+    encode_sentence,
+    forward_all,
+    max_sequence_length,
+    tag_packed_sequences,
+    tag_sequences,
+)
+from .manifest import Manifest, remove_superseded
+from .offset_grouping import OffsetGrouper
+from .profiling import NullProfiler
+
+
+MODEL_NAME = "KB/bert-base-swedish-cased-ner"
+BACKENDS = ("pytorch", "onnx", "onnx-int8")
+SENTENCE_PATTERN = re.compile("[^.?!\n]*[.?!]|[^.?!\n]+")
+HTML_PATTERN = re.compile("<.*>")
+# Punctuation for splitting sentences and grouping entities, including the
+# typographic apostrophe
+PUNCTUATION = frozenset(punctuation + "’")
+# Marks the end of the items in a queue between the stages of a pipelined run
+_DONE = object()
 
 
 def get_articles(path):
@@ -15,10 +46,12 @@ def get_articles(path):
 
     # return [article for article in articles]
 
-    with jsonlines.open(path) as reader:
-        obj_list = [obj for obj in reader]
+    return read_jsonl(path)
+
 
-    return obj_list
+def iter_articles(path):
+    """Lazily reads articles one at a time, for inputs too large to keep in memory."""
+    yield from iter_jsonl(path)
 
 
 def avg_score(entity):
@@ -120,44 +153,454 @@ def validate_scores(entities):
             exit()
 
 
-def recognize_entities(articles):
+def iter_sentence_spans(text):
+    """Yields the (start, end) spans of the sentences in a text in a single pass.
+
+    A sentence runs up to and including the first ".", "?" or "!", or up to the next
+    line break or the end of the text if it lacks terminal punctuation.
     """
-    Possible to use parameter grouped_entities=True in pipeline to auto-group
-    tokens/words into entities as of pr #3957 in the transformers repo. However,
-    it does not work as well (yet, 2020-07) as the group_entities function above.
+    for match in SENTENCE_PATTERN.finditer(text):
+        yield match.span()
+
+
+def extract_sentences(article, punct):
+    """Splits an article text into the sentences that are inputted to the model.
+
+    Returns the sentences and whether the article is to be omitted, which it is if
+    any of its sentences contains HTML tags. In that case no sentences are returned,
+    so that no inference is spent on the article.
     """
-    model_name = "KB/bert-base-swedish-cased-ner"
-    nlp = pipeline("ner", model=model_name, tokenizer=model_name)
+    text = article["text"].replace("\n\n", ".")
+    input_sentences = []
 
-    punct = set(punctuation)
-    punct.update("’")
-    all_entities = []
-    omitted_articles = []
+    for start, end in iter_sentence_spans(text):
+        # Omit any article containing HTML tags
+        if HTML_PATTERN.search(text, start, end):
+            return [], True
 
-    for article in tqdm(articles, desc="Article"):
-        text = article["text"].replace("\n\n", ".")
-        sentences = re.findall(".*?[.?!]", text)
+        input_sentence = text[start:end].strip()
+        if not input_sentence or input_sentence in punct:
+            continue
+
+        input_sentences += [input_sentence]
+
+    return input_sentences, False
+
+
+def load_pipeline():
+    return pipeline("ner", model=MODEL_NAME, tokenizer=MODEL_NAME)
+
+
+def _lookup(cache, sentences, profiler):
+    if not cache:
+        return [None] * len(sentences)
+
+    with profiler.stage("cache_lookup"):
+        return cache.get_many(sentences)
+
+
+def _recognize_serial(articles, nlp, punct, cache, profiler):
+    """Performs NER one sentence at a time."""
+    for article in articles:
+        with profiler.stage("sentence_splitting"):
+            sentences, html = extract_sentences(article, punct)
+
+        omit_reason = "html" if html else None
+        cached = _lookup(cache, sentences, profiler)
         entities = []
 
-        for sentence in sentences:
-            # Omit any article containing HTML tags
-            if re.search("<.*>", sentence):
-                omitted_articles += [article]
-                break
+        for sentence, sentence_entities in zip(sentences, cached):
+            if sentence_entities is None:
+                start = time.perf_counter()
+                try:
+                    with profiler.stage("model"):
+                        sentence_entities = nlp(sentence)
+                except IndexError:  # 1541 max length for input sentence
+                    omit_reason = "index_error"
+                    break
+                profiler.record_sentences([len(sentence)], time.perf_counter() - start)
+
+                if cache:
+                    cache.put(sentence, sentence_entities)
+
+            entities += sentence_entities
+
+        with profiler.stage("grouping"):
+            grouped_entities = group_entities(entities, punct)
+
+        yield article, grouped_entities, omit_reason
+
+
+def _recognize_batched(
+    articles, nlp, punct, batch_size, pack, cache, grouper, profiler, **forward_options
+):
+    """Performs NER on sentences gathered from several articles at once.
+
+    Articles are buffered until they contain at least batch_size sentences (or
+    bucket_window sentences, if larger), cached or not. The sentences that are not
+    cached are then tagged in padded batches and scattered back to their articles.
+    Articles whose sentences are all cached are yielded right away if no articles
+    are waiting to be tagged. The forward options are passed on to forward_all.
+    """
+    buffer_size = max(batch_size, forward_options.get("bucket_window") or 0)
+    max_length = max_sequence_length(nlp)
+
+    def flush(pending):
+        # Every sentence is a (sentence, token ids, offsets, cached token dicts) tuple
+        misses = [s for _, sentences, _ in pending for s in sentences if s[1]]
+        sequences = [ids for _, ids, _, _ in misses]
+        start = time.perf_counter()
+
+        with profiler.stage("model"):
+            if grouper:
+                tagged = forward_all(nlp, sequences, batch_size, **forward_options)
+            elif pack:
+                groups = [
+                    i for i, (_, ss, _) in enumerate(pending) for s in ss if s[1]
+                ]
+                tagged = tag_packed_sequences(
+                    nlp, sequences, groups, batch_size, **forward_options
+                )
+            else:
+                tagged = tag_sequences(nlp, sequences, batch_size, **forward_options)
+
+        lengths = [len(sentence) for sentence, _, _, _ in misses]
+        profiler.record_sentences(lengths, time.perf_counter() - start)
 
-            input_sentence = sentence.strip()
-            if not input_sentence or input_sentence in punct:
+        if grouper:
+            with profiler.stage("grouping"):
+                tagged = [
+                    grouper.group(sentence, ids, offsets, logits)
+                    for (sentence, ids, offsets, _), logits in zip(misses, tagged)
+                ]
+
+        if cache:
+            cache.put_many([sentence for sentence, _, _, _ in misses], tagged)
+        tagged = iter(tagged)
+
+        for article, sentences, omit_reason in pending:
+            entities = []
+            for _, ids, _, cached in sentences:
+                entities += next(tagged) if ids else cached
+
+            if not grouper:
+                with profiler.stage("grouping"):
+                    entities = group_entities(entities, punct)
+
+            yield article, entities, omit_reason
+
+    pending, no_pending, no_misses = [], 0, 0
+
+    for article in articles:
+        with profiler.stage("sentence_splitting"):
+            sentences, html = extract_sentences(article, punct)
+
+        omit_reason = "html" if html else None
+        cached = _lookup(cache, sentences, profiler)
+        to_tag = []
+
+        for sentence, sentence_entities in zip(sentences, cached):
+            if sentence_entities is not None:
+                to_tag += [(sentence, None, None, sentence_entities)]
                 continue
 
-            try:
-                sentence_entities = nlp(input_sentence)
-                entities += sentence_entities
-            except IndexError:  # 1541 max length for input sentence
-                omitted_articles += [article]
+            with profiler.stage("tokenization"):
+                if grouper:
+                    ids, offsets = grouper.encode(sentence)
+                else:
+                    ids, offsets = encode_sentence(nlp.tokenizer, sentence), None
+
+            # Sentences that are too long raise an IndexError in the serial path
+            if len(ids) > max_length:
+                omit_reason = "index_error"
                 break
 
-        grouped_entities = group_entities(entities, punct)
-        all_entities += [{"article": article, "entities": grouped_entities}]
+            to_tag += [(sentence, ids, offsets, None)]
+            no_misses += 1
+
+        pending += [(article, to_tag, omit_reason)]
+        no_pending += len(to_tag)
+
+        # Buffered cached sentences count too, so that memory stays bounded and
+        # output keeps flowing when most sentences are cached
+        if no_pending >= buffer_size or not no_misses:
+            yield from flush(pending)
+            pending, no_pending, no_misses = [], 0, 0
+
+    yield from flush(pending)
+
+
+def _tokenize_article(article, nlp, punct, max_length, profiler):
+    with profiler.stage("sentence_splitting"):
+        sentences, html = extract_sentences(article, punct)
+
+    omit_reason = "html" if html else None
+    encoded = []
+
+    with profiler.stage("tokenization"):
+        for sentence in sentences:
+            ids = encode_sentence(nlp.tokenizer, sentence)
+
+            # Sentences that are too long raise an IndexError in the serial path
+            if len(ids) > max_length:
+                omit_reason = "index_error"
+                break
+
+            encoded += [(sentence, ids)]
+
+    return article, encoded, omit_reason
+
+
+def _run_stage(target, output):
+    """Runs a pipeline stage in a daemon thread, passing _DONE, or the exception it
+    raised, on to the queue of the next stage when it ends.
+    """
+
+    def run():
+        try:
+            target()
+            output.put(_DONE)
+        except Exception as e:
+            output.put(e)
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def _iter_queue(input_queue):
+    for item in iter(input_queue.get, _DONE):
+        if isinstance(item, Exception):
+            raise item
+        yield item
+
+
+def _recognize_pipelined(
+    articles, nlp, punct, batch_size, tokenizer_threads, profiler, **forward_options
+):
+    """Performs NER in three overlapping stages, so that Python-side work is done
+    while the model runs.
+
+    A pool of tokenizer_threads threads splits and tokenizes the articles, which are
+    queued in chunks of at least batch_size sentences (or bucket_window sentences,
+    if larger). An inference thread runs the chunks through forward_all, and the
+    calling thread decodes and groups the entities of the tagged chunks, and writes
+    them if iterating over stream_entities. The queues between the stages are
+    bounded, keeping memory usage constant.
+    """
+    buffer_size = max(batch_size, forward_options.get("bucket_window") or 0)
+    max_length = max_sequence_length(nlp)
+    tokenized = queue.Queue(maxsize=4)
+    tagged = queue.Queue(maxsize=4)
+
+    def tokenize():
+        chunk, no_sentences = [], 0
+
+        def add(future):
+            nonlocal chunk, no_sentences
+            chunk += [future.result()]
+            no_sentences += len(chunk[-1][1])
+
+            if no_sentences >= buffer_size:
+                tokenized.put(chunk)
+                chunk, no_sentences = [], 0
+
+        with ThreadPoolExecutor(tokenizer_threads) as pool:
+            # Articles are submitted a few at a time, keeping the input order
+            futures = deque()
+            for article in articles:
+                futures.append(
+                    pool.submit(
+                        _tokenize_article, article, nlp, punct, max_length, profiler
+                    )
+                )
+                if len(futures) > 4 * tokenizer_threads:
+                    add(futures.popleft())
+
+            while futures:
+                add(futures.popleft())
+
+        tokenized.put(chunk)
+
+    def infer():
+        for chunk in _iter_queue(tokenized):
+            encoded = [s for _, sentences, _ in chunk for s in sentences]
+            sequences = [ids for _, ids in encoded]
+            start = time.perf_counter()
+
+            with profiler.stage("model"):
+                logits = forward_all(nlp, sequences, batch_size, **forward_options)
+
+            lengths = [len(sentence) for sentence, _ in encoded]
+            profiler.record_sentences(lengths, time.perf_counter() - start)
+            tagged.put((chunk, logits))
+
+    _run_stage(tokenize, tokenized)
+    _run_stage(infer, tagged)
+
+    for chunk, logits in _iter_queue(tagged):
+        logits = iter(logits)
+
+        for article, sentences, omit_reason in chunk:
+            with profiler.stage("grouping"):
+                entities = []
+                for _, ids in sentences:
+                    entities += decode_entities(nlp, ids, next(logits))
+
+                entities = group_entities(entities, punct)
+
+            yield article, entities, omit_reason
+
+
+def iterate_entities(
+    articles,
+    batch_size=None,
+    max_tokens=None,
+    pack=False,
+    cache=None,
+    grouping="tokens",
+    backend="pytorch",
+    bucket_window=None,
+    stats=None,
+    profiler=None,
+    tokenizer_threads=None,
+    torch_threads=None,
+    nlp=None,
+):
+    """Lazily performs NER on an iterable of articles, yielding a record of each
+    article and its entities as soon as it is processed, together with whether
+    the article is to be omitted.
+
+    If batch_size is given, sentences from consecutive articles are tagged together
+    in padded batches of at most batch_size sentences (and max_tokens tokens, if
+    given) instead of one at a time. The output is the same, apart from score
+    differences in the order of floating point precision caused by the padding.
+
+    If pack is also set, consecutive sentences of the same article are packed into
+    sequences of up to the model's max length, cutting the number of sequences to
+    run several-fold at the cost of predictions no longer being exactly the same.
+
+    If a SentenceCache is given, the token predictions of sentences seen in earlier
+    runs are read from it instead of being recomputed. Since packed predictions
+    depend on the surrounding sentences, a cache cannot be used when packing. Nor
+    can it be used with the ONNX backends, whose (quantized) predictions differ
+    from those of PyTorch that the cache is keyed on.
+
+    The tokens are grouped into entities by group_entities, unless grouping is set
+    to "offsets", in which case the OffsetGrouper is used instead. It requires the
+    tokens' character offsets and therefore a batch_size, and cannot be combined
+    with packing or a cache.
+
+    The model is run with PyTorch, unless backend is set to "onnx" or "onnx-int8",
+    in which case an exported (and quantized) ONNX graph is run with ONNX Runtime.
+    A batch size of 1 is used with these backends if no batch_size is given, but
+    packing, max_tokens and bucket_window always require one.
+
+    If bucket_window is given, windows of that many sentences are buffered and
+    batched by token length to minimise padding. The output order is unaffected.
+    Batched runs end by printing their padding ratio and effective tokens/s, unless
+    a BatchStats is given to collect them instead.
+
+    If a Profiler is given, the time spent in every stage, the model latency per
+    sentence length and the reasons for omitting articles are recorded with it.
+
+    If tokenizer_threads is given, batches are tagged in a pipeline of overlapping
+    stages: a pool of that many tokenizer threads, an inference thread and grouping
+    in the calling thread. It cannot be combined with packing, a cache or grouping
+    by offsets. torch_threads sets the number of threads PyTorch uses within
+    operations, which should leave cores for the other stages.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
+    if not batch_size and (pack or max_tokens or bucket_window):
+        raise ValueError("Packing, max_tokens and bucket_window require a batch_size")
+    if pack and cache:
+        raise ValueError("Packed sentences cannot be cached")
+    if cache and backend != "pytorch":
+        raise ValueError("Only predictions of the PyTorch backend are cached")
+    if grouping == "offsets" and (not batch_size or pack or cache):
+        raise ValueError("Grouping by offsets requires unpacked, uncached batches")
+    if tokenizer_threads and (not batch_size or pack or cache or grouping != "tokens"):
+        raise ValueError("Pipelining requires unpacked, uncached batches")
+
+    if torch_threads:
+        torch.set_num_threads(torch_threads)
+
+    nlp = nlp or load_pipeline()
+    profiler = profiler or NullProfiler()
+
+    runner = None
+    if backend != "pytorch":
+        # Imported here, since exporting requires the optional onnx package
+        from .onnx_backend import OnnxBackend
+
+        runner = OnnxBackend(nlp, quantize=backend == "onnx-int8")
+        batch_size = batch_size or 1
+
+    grouper = None
+    if grouping == "offsets":
+        fast_tokenizer = BertTokenizerFast.from_pretrained(MODEL_NAME)
+        grouper = OffsetGrouper(nlp, fast_tokenizer, PUNCTUATION)
+
+    print_stats = stats is None
+    stats = stats or BatchStats()
+    if tokenizer_threads:
+        recognized = _recognize_pipelined(
+            articles,
+            nlp,
+            PUNCTUATION,
+            batch_size,
+            tokenizer_threads,
+            profiler,
+            max_tokens=max_tokens,
+            backend=runner,
+            bucket_window=bucket_window,
+            stats=stats,
+        )
+    elif batch_size:
+        recognized = _recognize_batched(
+            articles,
+            nlp,
+            PUNCTUATION,
+            batch_size,
+            pack,
+            cache,
+            grouper,
+            profiler,
+            max_tokens=max_tokens,
+            backend=runner,
+            bucket_window=bucket_window,
+            stats=stats,
+        )
+    else:
+        recognized = _recognize_serial(articles, nlp, PUNCTUATION, cache, profiler)
+
+    for article, grouped_entities, omit_reason in recognized:
+        profiler.record_article(omit_reason)
+        yield {"article": article, "entities": grouped_entities}, bool(omit_reason)
+
+    if batch_size and print_stats:
+        stats.print_stats()
+    if cache:
+        cache.commit()
+        cache.print_stats()
+    profiler.write()
+
+
+def recognize_entities(articles, **kwargs):
+    """
+    Possible to use parameter grouped_entities=True in pipeline to auto-group
+    tokens/words into entities as of pr #3957 in the transformers repo. However,
+    it does not work as well (yet, 2020-07) as the group_entities function above.
+
+    Keyword arguments are passed on to iterate_entities.
+    """
+    all_entities = []
+    omitted_articles = []
+
+    recognized = iterate_entities(articles, **kwargs)
+    for record, omit in tqdm(recognized, desc="Article", total=len(articles)):
+        if omit:
+            omitted_articles += [record["article"]]
+        all_entities += [record]
 
     # validate_scores(grouped_entities)
 
@@ -168,6 +611,104 @@ def recognize_entities(articles):
     return all_entities, omitted_articles
 
 
+def stream_entities(
+    input_path,
+    results_path,
+    omitted_path,
+    flush_every=100,
+    manifest_path=None,
+    mode="overwrite",
+    **kwargs,
+):
+    """Performs NER on a JSONL file of articles with constant memory usage.
+
+    Articles are read lazily and every record is written as soon as it is produced,
+    with the output files flushed every flush_every articles, so that a crash only
+    loses the work since the last flush. Keyword arguments are passed on to
+    iterate_entities.
+
+    If results_path ends with .parquet, the results are written as an entities
+    table referencing the articles by id, see file_handling.EntityTableWriter.
+    Paths ending with .zst are compressed with Zstandard.
+
+    If a manifest_path is given, the ids and content hashes of the processed
+    articles are checkpointed to it at every flush. With mode "resume", articles
+    already processed are skipped and the output is appended to the existing files.
+    With mode "incremental", only new or changed articles are processed and
+    appended, and the records of changed articles are replaced.
+    """
+    paths = [results_path, omitted_path]
+    manifest = Manifest(manifest_path) if manifest_path else None
+    columnar = results_path.endswith(".parquet")
+    if manifest and (columnar or any(path.endswith(".zst") for path in paths)):
+        raise ValueError("A manifest requires uncompressed JSONL output")
+    append = manifest is not None and mode != "overwrite"
+
+    articles = iter_articles(input_path)
+    if append:
+        manifest.load()
+        manifest.restore(paths)
+        check_hash = mode == "incremental"
+        articles = (a for a in articles if not manifest.is_processed(a, check_hash))
+    elif manifest:
+        manifest.reset()
+
+    file_mode = "a" if append else "w"
+    offsets = [
+        os.path.getsize(path) if append and os.path.exists(path) else 0
+        for path in paths
+    ]
+    no_omitted = 0
+    changed_ids = set()
+    profiler = kwargs.get("profiler") or NullProfiler()
+
+    with ExitStack() as stack:
+        if columnar:
+            results = stack.enter_context(EntityTableWriter(results_path))
+        else:
+            results_f = stack.enter_context(open_jsonl(results_path, file_mode))
+            results = JsonlWriter(results_f)
+        omitted = JsonlWriter(stack.enter_context(open_jsonl(omitted_path, file_mode)))
+        recognized = iterate_entities(articles, **kwargs)
+
+        def checkpoint():
+            with profiler.stage("writing"):
+                # Row groups of an entities table are written as they fill up
+                if not columnar:
+                    results.flush()
+                omitted.flush()
+                if manifest:
+                    manifest.checkpoint(paths)
+
+        for i, (record, omit) in enumerate(tqdm(recognized, desc="Article"), 1):
+            with profiler.stage("writing"):
+                results.write(record)
+                if omit:
+                    omitted.write(record["article"])
+                    no_omitted += 1
+
+            if manifest:
+                if record["article"]["id"] in manifest.hashes:
+                    changed_ids.add(record["article"]["id"])
+                manifest.add(record["article"])
+
+            if i % flush_every == 0:
+                checkpoint()
+
+        checkpoint()
+        profiler.write()
+
+    if changed_ids:
+        get_ids = [lambda x: x["article"]["id"], lambda x: x["id"]]
+        for path, offset, get_id in zip(paths, offsets, get_ids):
+            remove_superseded(path, changed_ids, offset, get_id)
+        manifest.checkpoint(paths)
+
+        print(f"{len(changed_ids)} changed articles replaced")
+
+    print(f"{no_omitted} articles omitted")
+
+
 if __name__ == "__main__":
     articles = get_articles("data/input/articles_tt_new.jsonl")
 
@@ -179,3 +720,12 @@ if __name__ == "__main__":
 
     write_output_to_file(entities, "data/output/results_tt_new.jsonl")
     write_output_to_file(omitted, "data/output/omitted_tt_new.jsonl")
+
+    # For full runs: process only new or changed articles since the last run
+    # stream_entities(
+    #     "data/input/articles_tt_new.jsonl",
+    #     "data/output/results_tt_new.jsonl",
+    #     "data/output/omitted_tt_new.jsonl",
+    #     manifest_path="data/output/manifest_tt_new.jsonl",
+    #     mode="incremental",
+    # )
@@ -0,0 +1,114 @@
+import hashlib
+import json
+import sqlite3
+
+from ..utils.sqlite import select_in
+
+
+class SentenceCache:
+    """Persistent cache of the raw token predictions of the NER model per sentence.
+
+    Entries are keyed on a hash of the model name and the sentence text and stored
+    in a SQLite file. The number of entries is bounded by max_entries, beyond which
+    the least recently used entries are evicted.
+    """
+
+    def __init__(self, path, model_name, max_entries=5_000_000):
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS predictions "
+            "(key TEXT PRIMARY KEY, entities TEXT, last_used INTEGER)"
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS last_used_index ON predictions (last_used)"
+        )
+
+        self.size, last_used = self.connection.execute(
+            "SELECT COUNT(*), MAX(last_used) FROM predictions"
+        ).fetchone()
+        self.clock = last_used or 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _key(self, sentence):
+        key = f"{self.model_name}\0{sentence}".encode("utf-8")
+        return hashlib.sha1(key).hexdigest()
+
+    def _tick(self):
+        self.clock += 1
+        return self.clock
+
+    def get_many(self, sentences):
+        """Returns the cached predictions of each sentence, or None if not cached."""
+        keys = [self._key(sentence) for sentence in sentences]
+        query = "SELECT key, entities FROM predictions WHERE key IN"
+        found = dict(select_in(self.connection, query, keys))
+
+        self.connection.executemany(
+            "UPDATE predictions SET last_used = ? WHERE key = ?",
+            [(self._tick(), key) for key in keys if key in found],
+        )
+
+        predictions = [
+            json.loads(found[key]) if key in found else None for key in keys
+        ]
+        no_hits = sum(p is not None for p in predictions)
+        self.hits += no_hits
+        self.misses += len(predictions) - no_hits
+
+        return predictions
+
+    def get(self, sentence):
+        return self.get_many([sentence])[0]
+
+    def put_many(self, sentences, predictions):
+        """Stores the predictions of each sentence, evicting the least recently used
+        entries if the cache has grown too large.
+        """
+        rows = [
+            (
+                self._key(sentence),
+                json.dumps(entities, ensure_ascii=False),
+                self._tick(),
+            )
+            for sentence, entities in zip(sentences, predictions)
+        ]
+        before = self.connection.total_changes
+        self.connection.executemany(
+            "INSERT OR IGNORE INTO predictions VALUES (?, ?, ?)", rows
+        )
+        self.size += self.connection.total_changes - before
+
+        if self.size > self.max_entries:
+            self.connection.execute(
+                "DELETE FROM predictions WHERE key IN "
+                "(SELECT key FROM predictions ORDER BY last_used LIMIT ?)",
+                (self.size - self.max_entries,),
+            )
+            self.size = self.max_entries
+
+    def put(self, sentence, entities):
+        self.put_many([sentence], [entities])
+
+    def commit(self):
+        self.connection.commit()
+
+    def close(self):
+        self.commit()
+        self.connection.close()
+
+    def print_stats(self):
+        no_lookups = max(self.hits + self.misses, 1)
+        print(
+            f"Sentence cache: {self.hits} hits, {self.misses} misses "
+            f"(hit rate = {self.hits / no_lookups:.3f}), {self.size} entries"
+        )
@@ -0,0 +1,202 @@
+import argparse
+import json
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+from transformers import pipeline
+
+from .batching import BatchStats
+from .recognition import MODEL_NAME, iterate_entities
+
+
+class MicroBatcher:
+    """Merges concurrent NER requests into micro-batches.
+
+    Requests are queued and collected into a batch until it holds max_batch_size
+    requests or max_wait seconds have passed since its first request arrived. The
+    articles of a batch are then run through iterate_entities together, or one by
+    one if the batch fails, so that only the requests of failing articles fail.
+    Their sentences are tagged in batches of at most sentence_batch_size, however
+    many sentences the articles have.
+    """
+
+    def __init__(self, nlp, max_batch_size=32, max_wait=0.01, sentence_batch_size=32):
+        self.nlp = nlp
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.sentence_batch_size = sentence_batch_size
+        self.requests = queue.Queue()
+
+        self.start_time = time.perf_counter()
+        self.stats = BatchStats()
+        self.latencies = deque(maxlen=10000)
+        self.no_requests = 0
+        self.no_batches = 0
+
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, article):
+        """Queues an article and returns a future of its record and omitted flag."""
+        future = Future()
+        self.requests.put((article, future, time.perf_counter()))
+
+        return future
+
+    def _collect_batch(self):
+        batch = [self.requests.get()]
+        deadline = time.perf_counter() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch += [self.requests.get(timeout=timeout)]
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _recognize(self, articles):
+        return list(
+            iterate_entities(
+                articles,
+                batch_size=self.sentence_batch_size,
+                stats=self.stats,
+                nlp=self.nlp,
+            )
+        )
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+
+            try:
+                results = self._recognize([article for article, _, _ in batch])
+            except Exception:
+                # Retry the articles one by one, so that an article failing only
+                # fails its own request
+                results = []
+                for article, _, _ in batch:
+                    try:
+                        results += self._recognize([article])
+                    except Exception as e:
+                        results += [e]
+
+            done = time.perf_counter()
+            for (_, future, arrival), result in zip(batch, results):
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+                    self.latencies.append(done - arrival)
+
+            self.no_requests += len(batch)
+            self.no_batches += 1
+
+    def metrics(self):
+        latencies = np.array(self.latencies) * 1000
+        elapsed = time.perf_counter() - self.start_time
+        has_latencies = len(latencies) > 0
+
+        return {
+            "requests": self.no_requests,
+            "batches": self.no_batches,
+            "mean_batch_size": self.no_requests / max(self.no_batches, 1),
+            "p50_ms": float(np.percentile(latencies, 50)) if has_latencies else None,
+            "p99_ms": float(np.percentile(latencies, 99)) if has_latencies else None,
+            "requests_per_second": self.no_requests / elapsed,
+            "padding_ratio": self.stats.padding_ratio(),
+            "tokens_per_second": self.stats.tokens_per_second(),
+        }
+
+
+def create_handler(batcher):
+    class NerHandler(BaseHTTPRequestHandler):
+        """POST /ner with a JSON article (at least "text") returns its entities.
+        GET /metrics returns latency and throughput metrics.
+        """
+
+        def _respond(self, status, obj):
+            body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/metrics":
+                self._respond(200, batcher.metrics())
+            else:
+                self._respond(404, {"error": "Not found"})
+
+        def do_POST(self):
+            if self.path != "/ner":
+                self._respond(404, {"error": "Not found"})
+                return
+
+            length = int(self.headers.get("Content-Length", 0))
+            try:
+                article = json.loads(self.rfile.read(length))
+            except ValueError:
+                article = None
+            valid = isinstance(article, dict) and isinstance(article.get("text"), str)
+            if not valid:
+                self._respond(400, {"error": "Expected a JSON object with a text"})
+                return
+
+            try:
+                record, omit = batcher.submit(article).result()
+            except Exception as e:
+                self._respond(500, {"error": f"NER failed: {e}"})
+                return
+
+            self._respond(200, {"entities": record["entities"], "omitted": omit})
+
+        def log_message(self, *args):
+            pass
+
+    return NerHandler
+
+
+def serve(host, port, model, max_batch_size, max_wait, sentence_batch_size):
+    nlp = pipeline("ner", model=model, tokenizer=model)
+    batcher = MicroBatcher(nlp, max_batch_size, max_wait, sentence_batch_size)
+    server = ThreadingHTTPServer((host, port), create_handler(batcher))
+
+    print(f"Serving NER on http://{host}:{port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local NER inference server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    # A local directory with the model files, for running fully offline
+    parser.add_argument("--model", default=MODEL_NAME)
+    parser.add_argument(
+        "--max-batch-size", type=int, default=32, help="requests per micro-batch"
+    )
+    parser.add_argument("--max-wait", type=float, default=0.01)
+    parser.add_argument(
+        "--sentence-batch-size",
+        type=int,
+        default=32,
+        help="sentences per forward pass of the model",
+    )
+    args = parser.parse_args()
+
+    serve(
+        args.host,
+        args.port,
+        args.model,
+        args.max_batch_size,
+        args.max_wait,
+        args.sentence_batch_size,
+    )
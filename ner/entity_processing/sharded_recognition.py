@@ -0,0 +1,112 @@
+import os
+import shutil
+import tempfile
+from multiprocessing import get_context
+
+import torch
+
+from ..utils.file_handling import EntityTableWriter
+from ..utils.jsonl import iter_jsonl, open_jsonl
+from .recognition import load_pipeline, stream_entities
+
+# The pipeline is loaded once per worker process by _init_worker
+_nlp = None
+
+
+def split_into_shards(path, shard_dir, no_shards):
+    """Splits a (compressed) JSONL file into at most no_shards contiguous shards of
+    roughly equal size, keeping the input order. Returns the paths of the shards,
+    which are plain JSONL.
+    """
+    with open_jsonl(path) as f:
+        no_lines = sum(1 for line in f if line.strip())
+
+    shard_size = max(1, -(-no_lines // no_shards))
+    shard_paths = []
+    shard = None
+
+    with open_jsonl(path) as f:
+        lines = (line for line in f if line.strip())
+        for i, line in enumerate(lines):
+            if i % shard_size == 0:
+                if shard:
+                    shard.close()
+                shard_paths += [os.path.join(shard_dir, f"shard_{len(shard_paths)}")]
+                shard = open(shard_paths[-1] + ".jsonl", "wb")
+
+            shard.write(line if line.endswith(b"\n") else line + b"\n")
+
+    if shard:
+        shard.close()
+
+    return shard_paths
+
+
+def _init_worker(no_threads):
+    global _nlp
+
+    torch.set_num_threads(no_threads)
+    _nlp = load_pipeline()
+
+
+def _recognize_shard(args):
+    shard_path, batch_size = args
+    stream_entities(
+        shard_path + ".jsonl",
+        shard_path + "_results.jsonl",
+        shard_path + "_omitted.jsonl",
+        batch_size=batch_size,
+        nlp=_nlp,
+    )
+
+
+def merge_shards(paths, output_path):
+    """Concatenates the JSONL outputs of the shards, in shard order, into the same
+    layout as stream_entities writes to output_path: an entities table if it ends
+    with .parquet, and Zstandard-compressed JSONL if it ends with .zst.
+    """
+    if output_path.endswith(".parquet"):
+        with EntityTableWriter(output_path) as writer:
+            for path in paths:
+                for record in iter_jsonl(path):
+                    writer.write(record)
+        return
+
+    with open_jsonl(output_path, "w") as output:
+        for path in paths:
+            with open(path, "rb") as f:
+                shutil.copyfileobj(f, output)
+
+
+def recognize_sharded(
+    input_path, results_path, omitted_path, no_workers=None, batch_size=None
+):
+    """Performs NER on a JSONL file of articles with one process per shard of the
+    input, each loading the pipeline once. The merged results and omitted articles
+    are written in input order, i.e. in the same layout as recognize_entities.
+    """
+    no_workers = no_workers or os.cpu_count()
+    no_threads = max(1, os.cpu_count() // no_workers)
+
+    with tempfile.TemporaryDirectory() as shard_dir:
+        shard_paths = split_into_shards(input_path, shard_dir, no_workers)
+        tasks = [(shard_path, batch_size) for shard_path in shard_paths]
+
+        # Spawned rather than forked processes, since forking after torch has
+        # set up its thread pools is not safe
+        context = get_context("spawn")
+        with context.Pool(
+            max(1, len(shard_paths)), initializer=_init_worker, initargs=(no_threads,)
+        ) as pool:
+            pool.map(_recognize_shard, tasks, chunksize=1)
+
+        merge_shards([path + "_results.jsonl" for path in shard_paths], results_path)
+        merge_shards([path + "_omitted.jsonl" for path in shard_paths], omitted_path)
+
+
+if __name__ == "__main__":
+    recognize_sharded(
+        "data/input/articles_tt_new.jsonl",
+        "data/output/results_tt_new.jsonl",
+        "data/output/omitted_tt_new.jsonl",
+    )
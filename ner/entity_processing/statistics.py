@@ -0,0 +1,171 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from ..utils.file_handling import iter_entity_chunks
+from ..utils.jsonl import open_jsonl
+
+IGNORED_TYPES = ["TME", "MSR"]
+DIVIDER = "-" * 100
+
+
+def _exploded_scores(chunk):
+    """Returns the entity type and score of every token score of a chunk.
+
+    In older results, the score of an entity was a list of the scores of its
+    tokens, which are all counted like in the earlier row-by-row average.
+    """
+    scores = chunk[["entity", "score"]]
+    if not pd.api.types.is_float_dtype(scores["score"]):
+        scores = scores.explode("score").dropna(subset=["score"])
+
+    return scores.astype({"score": np.float64})
+
+
+class EntityStatistics:
+    """Statistics of entity types, scores and entities per article, accumulated
+    over chunks of an entity DataFrame, e.g. from iter_entity_chunks.
+
+    Every chunk is reduced with a few groupbys to counts and sums per type and per
+    article, so that only these, and not the entities, are kept in memory.
+    """
+
+    def __init__(self, no_bins=10):
+        self.bins = np.linspace(0, 1, no_bins + 1)
+        self.counts = []
+        self.scores = []
+        self.histograms = []
+        self.article_counts = []
+
+    def update(self, chunk):
+        self.counts += [chunk.groupby("entity", observed=True).size()]
+        self.article_counts += [chunk.groupby("article_id", observed=True).size()]
+
+        scores = _exploded_scores(chunk)
+        by_type = scores.groupby("entity", observed=True)["score"]
+        self.scores += [by_type.agg(["sum", "count"])]
+
+        no_bins = len(self.bins) - 1
+        bins = (scores["score"].to_numpy() * no_bins).astype(int)
+        bins = np.clip(bins, 0, no_bins - 1)
+        histogram = scores.groupby([scores["entity"], bins], observed=True).size()
+        self.histograms += [histogram]
+
+        # Reduce the partial results once in a while to bound their memory use
+        if len(self.counts) >= 100:
+            self._reduce()
+
+    def _reduce(self):
+        if not self.counts:
+            raise ValueError("No entities to compute statistics of")
+
+        def reduce(parts):
+            return [pd.concat(parts).groupby(level=0, observed=True).sum()]
+
+        self.counts = reduce(self.counts)
+        self.scores = reduce(self.scores)
+        self.article_counts = reduce(self.article_counts)
+        self.histograms = [
+            pd.concat(self.histograms).groupby(level=[0, 1], observed=True).sum()
+        ]
+
+    def types(self):
+        """Returns the number of entities, their share and mean score per type."""
+        self._reduce()
+        counts, scores = self.counts[0], self.scores[0]
+
+        df = pd.DataFrame({"count": counts, "share": counts / counts.sum()})
+        df["mean_score"] = scores["sum"] / scores["count"]
+        df.index = df.index.astype(str)
+
+        return df.sort_values(by=["count"], ascending=False)
+
+    def summary(self, ignore=IGNORED_TYPES, no_articles=None):
+        """Returns the mean score, entities per article and share of all entities
+        and of the entities of types not ignored.
+
+        Articles without any entities are only counted if no_articles is given.
+        """
+        self._reduce()
+        counts, scores = self.counts[0], self.scores[0]
+        no_articles = no_articles or len(self.article_counts[0])
+        desired = ~counts.index.astype(str).isin(ignore)
+
+        rows = {}
+        for name, mask in [("total", slice(None)), ("desired", desired)]:
+            rows[name] = {
+                "mean_score": scores["sum"][mask].sum() / scores["count"][mask].sum(),
+                "per_article": counts[mask].sum() / no_articles,
+                "share": counts[mask].sum() / counts.sum(),
+            }
+
+        return pd.DataFrame(rows).T
+
+    def entities_per_article(self, no_articles=None):
+        """Returns the distribution of the number of entities per article."""
+        self._reduce()
+        distribution = self.article_counts[0].value_counts().sort_index()
+        if no_articles and no_articles > len(self.article_counts[0]):
+            distribution.loc[0] = no_articles - len(self.article_counts[0])
+
+        return distribution.sort_index()
+
+    def score_histograms(self):
+        """Returns the number of scores of every type within each score bin."""
+        self._reduce()
+        histograms = self.histograms[0].unstack(fill_value=0)
+        no_bins = len(self.bins) - 1
+        histograms = histograms.reindex(columns=range(no_bins), fill_value=0)
+        histograms.index = histograms.index.astype(str)
+        histograms.columns = [
+            f"{start:.1f}–{end:.1f}" for start, end in zip(self.bins, self.bins[1:])
+        ]
+
+        return histograms
+
+    def print_report(self, no_articles=None):
+        print(DIVIDER, "\nSUMMARY\n", self.summary(no_articles=no_articles))
+        print(DIVIDER, "\nTYPES\n", self.types())
+        print(DIVIDER, "\nSCORES\n", self.score_histograms())
+
+        distribution = self.entities_per_article(no_articles)
+        cumulative = distribution.cumsum() / distribution.sum()
+        mean = (distribution.index * distribution).sum() / distribution.sum()
+        median = distribution.index[cumulative.searchsorted(0.5)]
+        p90 = distribution.index[cumulative.searchsorted(0.9)]
+        print(
+            f"Entities per article: mean = {mean} | median = {median} | "
+            f"90th percentile = {p90} | max = {distribution.index.max()}"
+        )
+        print(DIVIDER)
+
+
+def entity_statistics(chunks, no_bins=10):
+    statistics = EntityStatistics(no_bins)
+    for chunk in chunks:
+        statistics.update(chunk)
+
+    return statistics
+
+
+def count_articles(path):
+    """Counts the articles of JSONL results, one per line."""
+    with open_jsonl(path) as f:
+        return sum(1 for line in f if line.strip())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Entity statistics of NER output")
+    parser.add_argument("path", nargs="?", default="data/output/results_10k.jsonl")
+    parser.add_argument("--chunk-size", type=int, default=100_000)
+    parser.add_argument("--bins", type=int, default=10)
+    args = parser.parse_args()
+
+    chunks = iter_entity_chunks(
+        args.path, ["article_id", "entity", "score"], args.chunk_size
+    )
+    statistics = entity_statistics(chunks, args.bins)
+    # A Parquet entities table holds no articles without entities
+    no_articles = None if args.path.endswith(".parquet") else count_articles(args.path)
+    statistics.print_report(no_articles)
@@ -1,9 +1,10 @@
 from string import punctuation
 import random
 
-import jsonlines
 import regex
 
+from ..utils.jsonl import read_jsonl
+
 
 class Evaluator:
     """Class for evaluating NER models on two IOB tagged datasets: SUC 3.0 and Web News 2012, both from Språkbanken."""
@@ -91,10 +92,7 @@ class Evaluator:
     @staticmethod
     def get_results(path):
         """Returns previouslt saved evaluation results."""
-        with jsonlines.open(path, "r") as reader:
-            results = [obj for obj in reader]
-
-        return results
+        return read_jsonl(path)
 
     # f = found, g = golden standard, w = words, e = entities, i = index, d = dictionary, t = tag
     def _evaluate_typewise(self, f_w, f_e, g_w, g_e, d, t):
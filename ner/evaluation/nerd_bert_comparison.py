@@ -3,7 +3,7 @@ from string import punctuation
 import jsonlines
 import pandas as pd
 
-from ..utils.file_handling import create_dfs_from_file, read_df_from_file
+from ..utils.file_handling import create_dfs_from_file, dataset_paths, read_df_from_file
 
 
 def clean_entities(df):
@@ -44,8 +44,11 @@ def clean_entities(df):
 
 
 def create_entities_df():
-    bert_df = create_dfs_from_file("data/output/results_10k.jsonl", False)[1]
-    nerd_df = create_dfs_from_file("data/output/results_nerd_10k.jsonl", False)[1]
+    columns = ["word", "entity", "article_id"]
+    bert_df = create_dfs_from_file("data/output/results_10k.jsonl", False, columns)[1]
+    nerd_df = create_dfs_from_file(
+        "data/output/results_nerd_10k.jsonl", False, columns + ["count"]
+    )[1]
 
     nerd_df = clean_entities(nerd_df)
     nerd_df = nerd_df.drop(["count"], axis=1)
@@ -70,7 +73,9 @@ def compare_unique_entities(nerd_df, bert_df):
 
 def extract_mentioned_tags():
     """Extract the article tags mentioned in the text body to use as labels."""
-    articles_df = read_df_from_file("data/dataframes/articles_10k_df.jsonl")
+    articles_df = read_df_from_file(
+        dataset_paths("10k")["articles_df"], ["id", "tags", "content_text"]
+    )
 
     tags_dict = []
     for ind in articles_df.index:
@@ -86,9 +91,9 @@ def extract_mentioned_tags():
 def evaluate_against_tags(entities, tags):
     """Perform evaluation against tags."""
     id_list = tags["id"].values
-    filtered_entities = entities[entities["article_id"].apply(lambda x: x in id_list)]
+    filtered_entities = entities[entities["article_id"].isin(id_list)]
     filtered_entities = (
-        filtered_entities.groupby("article_id")["word"]
+        filtered_entities.groupby("article_id", observed=True)["word"]
         .apply(list)
         .reset_index(name="entities")
     )
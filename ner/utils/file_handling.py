@@ -1,40 +1,320 @@
-import jsonlines
+import sys
+from itertools import chain
+from operator import itemgetter
+
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+from pandas.api.types import union_categoricals
+
+from .jsonl import iter_jsonl, open_jsonl, write_jsonl
+
+# Columns of the entities table, which references articles by id instead of
+# embedding them like the JSONL records do
+ENTITY_COLUMNS = [
+    ("word", pa.string()),
+    ("entity", pa.string()),
+    ("score", pa.float64()),
+]
+# Extensions of DataFrames stored as (uncompressed) Feather/Arrow IPC files
+COLUMNAR_EXTENSIONS = (".feather", ".arrow")
+# Columns of the entity DataFrame that are stored as categoricals
+CATEGORICAL_COLUMNS = ["entity", "article_id"]
+
+
+def dataset_paths(dataset):
+    """Returns the paths of the files of a dataset, e.g. "tt_new", from the articles
+    inputted to NER to the DataFrames derived from its output.
+
+    The DataFrames passed between the scripts are Feather files, so that they are
+    memory-mapped and only the columns used are read, while the categories, whose
+    lists of (count, entity) pairs Arrow cannot store, are JSONL.
+    """
+    return {
+        "articles": f"data/input/articles_{dataset}.jsonl",
+        "results": f"data/output/results_{dataset}.jsonl",
+        "omitted": f"data/output/omitted_{dataset}.jsonl",
+        "manifest": f"data/output/manifest_{dataset}.jsonl",
+        "articles_df": f"data/dataframes/articles_{dataset}_df.feather",
+        "all_entities_df": f"data/dataframes/all_entities_{dataset}_df.feather",
+        "merged_entities_df": f"data/dataframes/merged_entities_{dataset}_df.feather",
+        "categories_df": f"data/dataframes/categories_{dataset}_df.jsonl",
+        "entity_table": f"data/entities_{dataset}.sqlite",
+    }
 
 
 def write_output_to_file(output, path):
-    with jsonlines.open(path, mode="w") as writer:
+    write_jsonl(output, path)
+
+
+def entity_schema(article_id):
+    """Returns the schema of an entities table whose article_id column has the type
+    of the given article id, integer or string, so that the ids read back match
+    those of the articles.
+    """
+    is_integer = isinstance(article_id, int) and not isinstance(article_id, bool)
+    article_id_type = pa.int64() if is_integer else pa.string()
+
+    return pa.schema([("article_id", article_id_type)] + ENTITY_COLUMNS)
+
+
+class EntityTableWriter:
+    """Writes the entities of NER records ({"article", "entities"}) as rows of a
+    Parquet table, buffering up to row_group_size rows in memory at a time.
+
+    The type of the article_id column is that of the id of the first article, see
+    entity_schema, and the ids of all articles must be of that type.
+    """
+
+    def __init__(self, path, row_group_size=100_000):
+        self.path = path
+        self.row_group_size = row_group_size
+        self.writer = None
+        self.columns = {name: [] for name in entity_schema("").names}
+
+    def write(self, record):
+        article_id = record["article"]["id"]
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.path, entity_schema(article_id))
+
+        for entity in record["entities"]:
+            self.columns["article_id"] += [article_id]
+            self.columns["word"] += [entity["word"]]
+            self.columns["entity"] += [entity["entity"]]
+            self.columns["score"] += [entity["score"]]
+
+        if len(self.columns["article_id"]) >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        if self.columns["article_id"]:
+            table = pa.Table.from_pydict(self.columns, schema=self.writer.schema)
+            self.writer.write_table(table)
+            self.columns = {name: [] for name in self.columns}
+
+    def close(self):
+        # An empty table is written if there were no records
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.path, entity_schema(""))
+        self.flush()
+        self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def write_entities_table(output, path):
+    with EntityTableWriter(path) as writer:
         for obj in output:
             writer.write(obj)
 
 
-def create_dfs_from_file(path, include_articles):
-    with jsonlines.open(path) as reader:
+def _compact_entities(columns, article_ids):
+    """Turns a chunk of entity columns into a DataFrame of compact column types."""
+    chunk = pd.DataFrame(columns)
+    if article_ids is not None:
+        chunk["article_id"] = article_ids
+
+    if "word" in chunk:
+        chunk["word"] = chunk["word"].map(sys.intern, na_action="ignore")
+    # Scores are kept as objects in results of older versions, which had lists of
+    # the scores of an entity's tokens
+    if "score" in chunk and pd.api.types.is_numeric_dtype(chunk["score"]):
+        chunk["score"] = chunk["score"].astype(np.float32)
+    for name in CATEGORICAL_COLUMNS:
+        if name in chunk:
+            chunk[name] = chunk[name].astype("category")
+
+    return chunk
+
+
+def _compact_table(table):
+    """Turns (part of) a Parquet entities table into a DataFrame of the same column
+    types as _compact_entities.
+    """
+    entities = table.to_pandas()
+    dtypes = {name: "category" for name in CATEGORICAL_COLUMNS}
+    dtypes["score"] = np.float32
+
+    return entities.astype({k: v for k, v in dtypes.items() if k in entities})
+
+
+def _concat_entities(chunks):
+    """Concatenates chunks of entities, merging the categories of their categorical
+    columns instead of falling back to objects like pd.concat does.
+    """
+    if not chunks:
+        return pd.DataFrame()
+
+    categorical = [name for name in CATEGORICAL_COLUMNS if name in chunks[0]]
+    if any(list(chunk.columns) != list(chunks[0].columns) for chunk in chunks):
+        categorical = []
+
+    entities = pd.concat(
+        [chunk.drop(columns=categorical) for chunk in chunks], ignore_index=True
+    )
+    for name in categorical:
+        merged = union_categoricals([chunk[name] for chunk in chunks])
+        entities.insert(list(chunks[0].columns).index(name), name, merged)
+
+    return entities
+
+
+def _field_values(entities, name):
+    """Returns the values of a field of entities, NaN for those without it."""
+    try:
+        return list(map(itemgetter(name), entities))
+    except KeyError:
+        return [entity.get(name, np.nan) for entity in entities]
+
+
+def _iter_entity_chunks(reader, columns, size, on_article=None):
+    """Yields the entities of NER records in DataFrames of about size rows, built
+    from a list per column that the values of every article's entities are
+    appended to, instead of from a dict per entity.
+    """
+    with_article_id = not columns or "article_id" in columns
+    names = [name for name in columns or [] if name != "article_id"]
+    data, article_ids = {name: [] for name in names}, []
+    no_rows = 0
+
+    for obj in reader:
+        if on_article:
+            on_article(obj["article"])
+
+        entities = obj["entities"]
+        if not entities:
+            continue
+
+        # Without given columns, every field of the entities is loaded, and fields
+        # missing from some entities are NaN, like in a DataFrame of entity dicts
+        if not columns:
+            for name in dict.fromkeys(chain.from_iterable(entities)):
+                if name not in data:
+                    data[name] = [np.nan] * no_rows
+                    names += [name]
+
+        for name in names:
+            data[name] += _field_values(entities, name)
+        if with_article_id:
+            article_ids += [obj["article"]["id"]] * len(entities)
+        no_rows += len(entities)
+
+        if no_rows >= size:
+            yield _compact_entities(data, article_ids if with_article_id else None)
+            data, article_ids = {name: [] for name in data}, []
+            no_rows = 0
+
+    if no_rows:
+        yield _compact_entities(data, article_ids if with_article_id else None)
+
+
+def _read_entity_chunks(reader, include_articles, columns, article_columns, size):
+    articles = []
+
+    def add_article(article):
+        if article_columns:
+            article = {k: v for k, v in article.items() if k in article_columns}
+        articles.append(article)
+
+    on_article = add_article if include_articles else None
+    chunks = list(_iter_entity_chunks(reader, columns, size, on_article))
+
+    return pd.DataFrame(articles), _concat_entities(chunks)
+
+
+def iter_entity_chunks(path, columns=None, chunk_size=100_000):
+    """Yields the entities of NER output as DataFrames of about chunk_size rows, of
+    the same compact column types as create_dfs_from_file, so that output too large
+    to load at once can be processed chunk by chunk. A Parquet entities table is
+    read one row group at a time.
+    """
+    if not path.endswith(".parquet"):
+        yield from _iter_entity_chunks(iter_jsonl(path), columns, chunk_size)
+        return
+
+    table = pq.ParquetFile(path)
+    for i in range(table.num_row_groups):
+        yield _compact_table(table.read_row_group(i, columns=columns))
+
+
+def create_dfs_from_file(
+    path,
+    include_articles,
+    columns=None,
+    articles_path=None,
+    article_columns=None,
+    chunk_size=100_000,
+):
+    """Loads NER output into an article and an entity DataFrame.
+
+    Entities are read in chunks of chunk_size, each turned into compact columns
+    right away: categorical entity types and article ids, float32 scores and
+    interned words. If columns are given,
+    only those entity columns are loaded, and if article_columns are given, only
+    those article fields, e.g. leaving out the article bodies.
+
+    For a Parquet entities table, which holds no articles, these are read from
+    articles_path (the NER input) if needed.
+    """
+    if path.endswith(".parquet"):
+        if include_articles and not articles_path:
+            raise ValueError("An entities table requires articles_path for articles")
+
+        articles = read_df_from_file(articles_path) if include_articles else None
+        if include_articles and article_columns:
+            articles = articles[[c for c in articles if c in article_columns]]
+
+        entities = _compact_table(pq.read_table(path, columns=columns))
+
+        return pd.DataFrame(articles), entities
+
+    return _read_entity_chunks(
+        iter_jsonl(path), include_articles, columns, article_columns, chunk_size
+    )
 
-        articles = []
-        entities = []
 
-        for obj in reader:
-            if include_articles:
-                articles += [obj["article"]]
-            article_id = obj["article"]["id"]
+def write_df_to_file(df, path, chunk_size=10_000):
+    """Writes a DataFrame as JSONL records, chunk_size rows at a time, or as an
+    uncompressed Feather file, which can be memory-mapped, if the path ends with
+    .feather or .arrow. Like with JSONL, the index is not kept.
+    """
+    if path.endswith(COLUMNAR_EXTENSIONS):
+        df = df.reset_index(drop=True)
+        feather.write_feather(df, path, compression="uncompressed")
+        return
 
-            for entity in obj["entities"]:
-                entities += [entity]
-                entities[-1]["article_id"] = article_id
+    with open_jsonl(path, "w") as f:
+        for start in range(0, len(df), chunk_size):
+            chunk = df.iloc[start : start + chunk_size]
+            json_form = chunk.to_json(orient="records", lines=True, force_ascii=False)
+            f.write(json_form.rstrip("\n").encode("utf-8") + b"\n")
 
-    return pd.DataFrame(articles), pd.DataFrame(entities)
 
+def read_df_from_file(path, columns=None):
+    """Reads a DataFrame written by write_df_to_file, keeping only the given columns.
 
-def write_df_to_file(df, path):
-    json_form = df.to_json(orient="records", lines=True, force_ascii=False)
+    Feather files are memory-mapped, so that only the pages of the given columns are
+    read, and numeric columns without missing values are not copied.
+    """
+    if path.endswith(COLUMNAR_EXTENSIONS):
+        table = feather.read_table(path, columns=columns, memory_map=True)
+        df = table.to_pandas(split_blocks=True)
 
-    with open(path, "w") as f:
-        f.write(json_form)
+        # Arrow turns lists into arrays, while the pipeline expects lists
+        for field in table.schema:
+            if pa.types.is_list(field.type):
+                df[field.name] = table.column(field.name).to_pylist()
 
+        return df
 
-def read_df_from_file(path):
-    with jsonlines.open(path) as reader:
-        obj_list = [obj for obj in reader]
+    objs = iter_jsonl(path)
+    if columns:
+        objs = ({k: obj[k] for k in columns if k in obj} for obj in objs)
 
-    return pd.DataFrame(obj_list)
+    return pd.DataFrame(list(objs))
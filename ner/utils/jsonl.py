@@ -0,0 +1,92 @@
+import io
+
+import numpy as np
+import orjson
+import zstandard
+
+# Size of the buffers between the JSON encoder and the (compressed) file
+BUFFER_SIZE = 1 << 20
+ZSTD_LEVEL = 3
+OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _default(obj):
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj):
+    """Encodes an object as a UTF-8 JSON line, without the line break."""
+    return orjson.dumps(obj, default=_default, option=OPTIONS)
+
+
+def loads(line):
+    return orjson.loads(line)
+
+
+def open_jsonl(path, mode="r"):
+    """Opens a JSONL file as a buffered binary file, (de)compressing it on the fly
+    if the path ends with .zst. Mode is "r", "w" or "a"; appending to a compressed
+    file adds a new frame to it.
+    """
+    f = open(path, mode + "b")
+    if not path.endswith(".zst"):
+        return f
+
+    if mode == "r":
+        reader = zstandard.ZstdDecompressor().stream_reader(
+            f, read_across_frames=True, closefd=True
+        )
+        return io.BufferedReader(reader, BUFFER_SIZE)
+
+    compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+    writer = compressor.stream_writer(f, write_size=BUFFER_SIZE, closefd=True)
+    return io.BufferedWriter(writer, BUFFER_SIZE)
+
+
+def iter_jsonl(path):
+    """Lazily reads the objects of a (compressed) JSONL file one at a time."""
+    with open_jsonl(path) as f:
+        for line in f:
+            if line.strip():
+                yield loads(line)
+
+
+def read_jsonl(path):
+    return list(iter_jsonl(path))
+
+
+class JsonlWriter:
+    """Writes objects as JSON lines to a binary file, collecting the encoded lines
+    in a buffer that is written in bulk whenever it exceeds buffer_size bytes.
+    """
+
+    def __init__(self, f, buffer_size=BUFFER_SIZE):
+        self.f = f
+        self.buffer_size = buffer_size
+        self.buffer = bytearray()
+
+    def write(self, obj):
+        self.buffer += dumps(obj)
+        self.buffer += b"\n"
+
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def write_all(self, objs):
+        for obj in objs:
+            self.write(obj)
+
+    def flush(self):
+        if self.buffer:
+            self.f.write(self.buffer)
+            self.buffer = bytearray()
+        self.f.flush()
+
+
+def write_jsonl(objs, path, mode="w"):
+    with open_jsonl(path, mode) as f:
+        writer = JsonlWriter(f)
+        writer.write_all(objs)
+        writer.flush()
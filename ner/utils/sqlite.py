@@ -0,0 +1,13 @@
+# SQLite limits the number of variables in a query
+MAX_VARIABLES = 500
+
+
+def select_in(connection, query, values):
+    """Yields the rows of a query ending with "IN" for the given values, run for at
+    most MAX_VARIABLES values at a time.
+    """
+    values = list(values)
+    for i in range(0, len(values), MAX_VARIABLES):
+        chunk = values[i : i + MAX_VARIABLES]
+        placeholders = ",".join("?" * len(chunk))
+        yield from connection.execute(f"{query} ({placeholders})", chunk)